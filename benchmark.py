@@ -0,0 +1,284 @@
+# Copyright xbyteW 2024
+"""
+Headless startup and chapter switch benchmark.
+
+Every run starts ManhwaViewer twice in a fresh sandbox on Qt's offscreen platform, against a local HTTP server that
+stands in for the provider sites. The first start has an empty cache and loads, switches forward and back a chapter;
+the second start shows the chapter cached by the first one. The median of every phase over all runs is saved as json
+and compared to a baseline, a phase that got slower than the tolerance allows is reported and exits with code 1.
+
+    python benchmark.py                    # Compare against benchmark_baseline.json
+    python benchmark.py --update-baseline  # Save the results as the new baseline
+"""
+import config  # Configures python environment before anything else is done
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import statistics
+import subprocess
+import threading
+import argparse
+import tempfile
+import shutil
+import struct
+import json
+import zlib
+import time
+import sys
+import os
+
+APP_FOLDER = os.path.dirname(os.path.abspath(__file__))
+INTERNAL_FOLDER = os.path.join(APP_FOLDER, "_internal")
+if os.path.isdir(INTERNAL_FOLDER):  # Built layout, the app data and modules live in _internal
+    sys.path.insert(0, INTERNAL_FOLDER)
+else:
+    INTERNAL_FOLDER = APP_FOLDER
+
+PROVIDER_SOURCE = '''from modules.AutoProviderPlugin import AutoProviderPlugin
+import os
+
+
+class AutoProviderPluginBenchmark(AutoProviderPlugin):
+    def __init__(self, title, chapter, chapter_rate, data_folder, cache_folder, provider, num_workers=10):
+        super().__init__(title=title, chapter=chapter, chapter_rate=chapter_rate, data_folder=data_folder,
+                         cache_folder=cache_folder, provider=provider,
+                         specific_provider_website=os.environ["MV_BENCHMARK_HOST"],
+                         logo_path="./data/ManhwaClanLogo.png", num_workers=num_workers)
+
+    def _indirect_provider(self):
+        return self._direct_provider()
+
+    def _direct_provider(self):
+        return f"http://{self.specific_provider_website}/chapter-{self.chapter_str}/"
+
+    def _get_chapter_list(self):
+        return [(chapter, f"http://{self.specific_provider_website}/chapter-{chapter}/") for chapter in range(1, 11)]
+
+    def get_search_results(self, text):
+        if text is None:
+            return True
+        return ([title, ""] for title in ["Benchmark Series"] if text.lower() in title.lower())
+'''
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Chapter pages at /chapter-N/ with pages images each, every image is the same generated png."""
+    protocol_version = "HTTP/1.1"
+    pages = 20
+    image = b""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        if self.path.startswith("/chapter-") and self.path.endswith("/"):
+            body = ("<html><body>" + "".join(f'<img src="{page}.png">' for page in range(1, self.pages + 1))
+                    + "</body></html>").encode()
+            content_type = "text/html"
+        elif self.path.startswith("/chapter-") and self.path.endswith(".png"):
+            body, content_type = self.image, "image/png"
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+
+def make_page_image(width: int = 800, height: int = 1200) -> bytes:
+    """A plain rgb png, written by hand so the server doesn't need Qt."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + bytes((120, 160, 200)) * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b""))
+
+
+def make_sandbox() -> str:
+    """A throwaway app folder with the default data and only the benchmark provider."""
+    sandbox = tempfile.mkdtemp(prefix="mv-benchmark-")
+    shutil.copytree(os.path.join(INTERNAL_FOLDER, "data"), os.path.join(sandbox, "data"))
+    os.makedirs(os.path.join(sandbox, "cache"))
+    empty_image = os.path.join(INTERNAL_FOLDER, "cache", "empty.png")
+    shutil.copyfile(empty_image if os.path.isfile(empty_image) else os.path.join(sandbox, "data", "empty.png"),
+                    os.path.join(sandbox, "cache", "empty.png"))
+    os.makedirs(os.path.join(sandbox, "extensions"))
+    with open(os.path.join(sandbox, "extensions", "benchmark_provider.py"), "w", encoding="utf-8") as f:
+        f.write(PROVIDER_SOURCE)
+    return sandbox
+
+
+def run_child(cold: bool):
+    """Runs one start inside the current folder and prints the phase timings as json."""
+    from modules.StartupProfiler import StartupProfiler
+    profiler = StartupProfiler._instance = StartupProfiler(enabled=True)
+    profiler.install()
+    sandbox = os.getcwd()
+    os.chdir(APP_FOLDER)  # Imports resolve like for nmv.py
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import QObject, QEvent, QTimer
+    import nmv
+    os.chdir(sandbox)
+
+    nmv.MainWindow.check_for_update = lambda self: None  # Don't measure the internet
+    app = QApplication(sys.argv)
+    if cold:
+        from modules.Classes import Settings
+        settings = Settings(os.path.join(sandbox, "data", "data.db"))
+        for name, value in (("provider", "Benchmark"), ("title", "Benchmark Series"), ("chapter", 1),
+                            ("chapter_rate", 1.0), ("update_info", False), ("no_update_info", False)):
+            getattr(settings, f"set_{name}")(value)
+        settings.close()
+
+    phases = {}
+    first_paint = {"start": None, "name": None}
+
+    class PaintWatcher(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Type.Paint and first_paint["name"] is not None:
+                pages, paths = window.content_pages, window.content_paths
+                if pages and paths and pages[0].is_loaded() and pages[0].path == paths[0]:
+                    phases[first_paint["name"]] = time.perf_counter() - first_paint["start"]
+                    first_paint["name"] = None
+            return False
+
+    def wait_for_paint(name, start, then, timeout=60.0):
+        first_paint["name"], first_paint["start"] = name, start
+        deadline = time.perf_counter() + timeout
+
+        def check():
+            if first_paint["name"] is None:
+                QTimer.singleShot(0, then)
+            elif time.perf_counter() > deadline:
+                print(f"{name} never painted a page", file=sys.stderr)
+                first_paint["name"] = None
+                QTimer.singleShot(0, then)
+            else:
+                QTimer.singleShot(5, check)
+        check()
+
+    def switch(name, func, then):
+        start = time.perf_counter()
+        func()
+        window.page_canvas.update()
+        wait_for_paint(name, start, then)
+
+    def finish():
+        previous = 0.0
+        for phase, seconds in profiler.phases:
+            phases[f"startup: {phase}"] = seconds - previous
+            previous = seconds
+        phases["startup: total"] = previous
+        window.close()
+        app.quit()
+
+    watcher = PaintWatcher()
+    window = nmv.MainWindow(app)
+    window.page_canvas.installEventFilter(watcher)
+    if cold:
+        QTimer.singleShot(0, lambda: switch(
+            "chapter load", window.reload_chapter, lambda: switch(
+                "next chapter", window.next_chapter, lambda: switch(
+                    "previous chapter", window.previous_chapter, finish))))
+    else:
+        window.page_canvas.update()
+        wait_for_paint("first page painted", profiler.start, finish)  # From the launch, imports included
+    app.exec()
+    sys.__stdout__.write(json.dumps(phases) + "\n")  # The app redirects and closes sys.stdout
+
+
+def run(runs: int, pages: int) -> dict:
+    StandInHandler.pages = pages
+    StandInHandler.image = make_page_image()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", MV_THEME="light",
+               MV_BENCHMARK_HOST=f"127.0.0.1:{server.server_address[1]}")
+
+    samples = {}
+    try:
+        for i in range(runs):
+            sandbox = make_sandbox()
+            try:
+                for kind in ("cold", "warm"):
+                    result = subprocess.run([sys.executable, os.path.abspath(__file__), f"--child={kind}"],
+                                            cwd=sandbox, env=env, capture_output=True, text=True, timeout=300)
+                    if result.returncode != 0:
+                        raise RuntimeError(f"The {kind} start failed:\n{result.stderr[-2000:]}")
+                    phases = json.loads(result.stdout.strip().splitlines()[-1])
+                    for phase, seconds in phases.items():
+                        samples.setdefault(f"{kind} {phase}", []).append(seconds)
+            finally:
+                shutil.rmtree(sandbox, ignore_errors=True)
+            print(f"Run {i + 1}/{runs} done")
+    finally:
+        server.shutdown()
+    return {phase: round(statistics.median(values), 4) for phase, values in samples.items()}
+
+
+def compare(phases: dict, baseline: dict, tolerance: float, min_delta: float) -> list:
+    """Returns the phases that got slower than the baseline by more than tolerance and min_delta seconds."""
+    regressions = []
+    print(f"{'Phase':<45} {'Baseline':>9} {'Now':>9} {'Change':>8}")
+    for phase, seconds in phases.items():
+        before = baseline.get(phase)
+        if before is None:
+            print(f"{phase:<45} {'-':>9} {seconds:>8.3f}s {'new':>8}")
+            continue
+        change = (seconds - before) / before if before else 0.0
+        regressed = seconds > before * (1 + tolerance) and seconds - before > min_delta
+        print(f"{phase:<45} {before:>8.3f}s {seconds:>8.3f}s {change:>+7.0%}{' !' if regressed else ''}")
+        if regressed:
+            regressions.append(phase)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless startup and chapter switch benchmark")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=20, help="Pages per chapter")
+    parser.add_argument("--output", default=None, help="Where to save the results as json")
+    parser.add_argument("--baseline", default=os.path.join(APP_FOLDER, "benchmark_baseline.json"))
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown, 0.25 is 25%%")
+    parser.add_argument("--min-delta", type=float, default=0.02, help="Slowdowns below this many seconds are noise")
+    parser.add_argument("--child", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child == "cold")
+        return
+
+    phases = run(args.runs, args.pages)
+    results = {"phases": phases, "runs": args.runs, "pages": args.pages, "python": sys.version.split()[0],
+               "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+        print(f"Saved the baseline to {args.baseline}")
+        return
+    if not os.path.isfile(args.baseline):
+        compare(phases, {}, args.tolerance, args.min_delta)
+        print(f"There is no baseline at {args.baseline} yet, save one with --update-baseline")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["phases"]
+    regressions = compare(phases, baseline, args.tolerance, args.min_delta)
+    if regressions:
+        print(f"{len(regressions)} phase(s) got slower: {', '.join(regressions)}")
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
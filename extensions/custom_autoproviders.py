@@ -39,7 +39,7 @@ class AutoProviderPluginAsuraToon(AutoProviderPlugin):
         base_url = self.specific_provider_website
         search_url = f"https://{base_url}?s={query or self.title}"
 
-        response = requests.get(search_url)
+        response = self.session.get(search_url)
         response.raise_for_status()
 
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -57,9 +57,8 @@ class AutoProviderPluginAsuraToon(AutoProviderPlugin):
 
         return titles_urls
 
-    @staticmethod
-    def _get_chapter_url(page_url, chapter_number):
-        response = requests.get(page_url)
+    def _get_chapter_url(self, page_url, chapter_number):
+        response = self.session.get(page_url)
 
         if response.status_code != 200:
             return "Failed to retrieve the web page."
@@ -89,9 +88,33 @@ class AutoProviderPluginAsuraToon(AutoProviderPlugin):
 
         return chapter_url or page_url
 
-    def _direct_provider(self):
+    def _get_chapter_list(self):
+        response = self.session.get(self._get_series_url(self._find_series_url))
+        if response.status_code != 200:
+            return None
+
+        soup = BeautifulSoup(response.content, 'html.parser')
+        chapter_list_ul = soup.select_one('div#chapterlist ul.clstyle')
+        if not chapter_list_ul:
+            return None
+
+        chapters = []
+        for li in chapter_list_ul.find_all('li', {"data-num": True}):
+            a_tag = li.find('a')
+            if not a_tag or 'href' not in a_tag.attrs:
+                continue
+            try:
+                chapters.append((float(li['data-num'].split()[0]), a_tag['href']))
+            except (ValueError, IndexError):
+                continue  # Skip non-numeric data
+        return chapters
+
+    def _find_series_url(self):
         response_data = self._search()
-        base_url = response_data.get(next(iter(response_data)))
+        return response_data.get(next(iter(response_data)))
+
+    def _direct_provider(self):
+        base_url = self._get_series_url(self._find_series_url)
         chapter_url = self._get_chapter_url(base_url, self.chapter)
         if chapter_url:
             print("Found URL:" + chapter_url)  # Concatenate (add-->+) string, to avoid breaking timestamps
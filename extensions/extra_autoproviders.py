@@ -1,5 +1,5 @@
 from modules.AutoProviderPlugin import AutoProviderBaseLike
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urljoin
 from bs4 import BeautifulSoup
 import requests
 import json
@@ -326,7 +326,7 @@ class AutoProviderPluginKingOfShojo(AutoProviderBaseLike):
         base_url = self.specific_provider_website
         search_url = f"https://{base_url}?s={query or self.title}"
 
-        response = requests.get(search_url)
+        response = self.session.get(search_url)
         response.raise_for_status()
 
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -374,7 +374,7 @@ class AutoProviderPluginRManga(AutoProviderBaseLike):
         base_url = self.specific_provider_website
         search_url = f"https://{base_url}/search/autocomplete/?dataType=json&query={query or self.title}"
 
-        response = requests.get(search_url)
+        response = self.session.get(search_url)
         response.raise_for_status()
 
         results = json.loads(response.text)
@@ -384,8 +384,8 @@ class AutoProviderPluginRManga(AutoProviderBaseLike):
         return {"data": []}
 
     def _direct_provider(self):
-        response_data = self._search()
-        url = self._get_url(response_data["data"][0]["url"] + f"/chapter-{self.chapter_str}/all-pages",
+        series_url = self._get_series_url(lambda: self._search()["data"][0]["url"])
+        url = self._get_url(series_url + f"/chapter-{self.chapter_str}/all-pages",
                             f'chapter {self.chapter} {self.title.title()}')
         if url:
             print("Found URL:" + url)  # Concatenate (add-->+) string, to avoid breaking timestamps
@@ -416,7 +416,7 @@ class AutoProviderPluginReadManga(AutoProviderBaseLike):
         base_url = self.specific_provider_website
         search_url = f"https://{base_url}/search/autocomplete/?dataType=json&query={query or self.title}"
 
-        response = requests.get(search_url)
+        response = self.session.get(search_url)
         response.raise_for_status()
 
         results = json.loads(response.text)
@@ -426,8 +426,8 @@ class AutoProviderPluginReadManga(AutoProviderBaseLike):
         return {"data": []}
 
     def _direct_provider(self):
-        response_data = self._search()
-        url = self._get_url(response_data["data"][0]["url"] + f"/chapter-{self.chapter_str}/all-pages",
+        series_url = self._get_series_url(lambda: self._search()["data"][0]["url"])
+        url = self._get_url(series_url + f"/chapter-{self.chapter_str}/all-pages",
                             f'chapter {self.chapter} {self.title.title()}')
         if url:
             print("Found URL:" + url)  # Concatenate (add-->+) string, to avoid breaking timestamps
@@ -455,7 +455,7 @@ class AutoProviderPluginBaozimh(AutoProviderBaseLike):
         base_url = self.specific_provider_website
         search_url = f"https://{base_url}?s={query or self.title}"
 
-        response = requests.get(search_url)
+        response = self.session.get(search_url)
         response.raise_for_status()
 
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -474,7 +474,7 @@ class AutoProviderPluginBaozimh(AutoProviderBaseLike):
 
     def _get_chapter_url(self, page_url, chapter_number):
         base_name = urlparse(page_url).path.strip('/').split('/')[-1]
-        response = requests.get(f"https://{self.specific_provider_website}/chapterlist/{base_name}.html")
+        response = self.session.get(f"https://{self.specific_provider_website}/chapterlist/{base_name}.html")
 
         if response.status_code != 200:
             return "Failed to retrieve the web page."
@@ -494,9 +494,29 @@ class AutoProviderPluginBaozimh(AutoProviderBaseLike):
 
         return f"https://{self.specific_provider_website}/manga/{base_name}/{content_number}_{str(chapter_number).replace('.', '_')}.html" or page_url
 
+    def _get_chapter_list(self):
+        page_url = self._get_series_url(lambda: self._search()["data"][0]["url"])
+        base_name = urlparse(page_url).path.strip('/').split('/')[-1]
+        response = self.session.get(f"https://{self.specific_provider_website}/chapterlist/{base_name}.html")
+        if response.status_code != 200:
+            return None
+
+        soup = BeautifulSoup(response.content, 'html.parser')
+        chapters = []
+        for a_tag in soup.find_all('a', class_='wp-manga-chapterlist'):
+            link = a_tag.attrs.get("href")
+            if not link:
+                continue
+            # The file name is {content number}_{chapter with _ instead of .}.html
+            file_name = link.strip("/").split("/")[-1].removesuffix(".html")
+            try:
+                chapters.append((float(file_name.split("_", 1)[1].replace("_", ".")), urljoin(page_url, link)))
+            except (ValueError, IndexError):
+                continue
+        return chapters
+
     def _direct_provider(self):
-        response_data = self._search()
-        base_url = response_data["data"][0]["url"]
+        base_url = self._get_series_url(lambda: self._search()["data"][0]["url"])
         chapter_url = self._get_chapter_url(base_url, self.chapter)
 
         if chapter_url:
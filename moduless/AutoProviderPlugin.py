@@ -1,35 +1,120 @@
-from aplustools.data.imagetools import OnlineImage, OfflineImage
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from aplustools.web.search import Search
 from urllib.parse import urljoin, urlparse
 from typing import Optional, Union, List
-from requests.sessions import Session
+from email.utils import parsedate_to_datetime
 from abc import ABC, abstractmethod
-from multiprocessing import Pool
 from bs4 import BeautifulSoup
-from queue import Queue
-from PIL import Image
+from queue import Queue, Empty
 import unicodedata
 import threading
 import requests
 import urllib3
+import shutil
+import random
+import copy
 import time
 import re
 import os
 
-from aplustools.package.timid import TimidTimer
+from modules.HttpClient import HttpClient
+from modules.RobotsCache import RobotsCache
+from modules.Tracing import Tracer
+from modules.UrlCache import ChapterIndex
 
-import aiohttp
 import asyncio
-import aiofiles
 
-convert_image_format = OnlineImage.convert_image_format
+# aplustools.data.imagetools, aplustools.web.search, PIL, aiohttp and aiofiles are only imported once they are used,
+# importing them takes longer than showing the window
+
+
+def convert_image_format(*args, **kwargs):
+    from aplustools.data.imagetools import OnlineImage
+    return OnlineImage.convert_image_format(*args, **kwargs)
 
 # Disable only the specific InsecureRequestWarning
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
+class ChapterPrefetcher:
+    """
+    Resolves and downloads the chapters around the current one in the background. Every chapter gets its own slot
+    folder, so switching to a prefetched chapter only means switching the slot that is displayed.
+    """
+    def __init__(self, provider: "AutoProviderPlugin"):
+        self.provider = provider
+        self.jobs = {}  # slot name -> job dict
+        self.lock = threading.Lock()
+
+    def prefetch(self, chapters: list):
+        for chapter in chapters:
+            if chapter <= 0:
+                continue
+            clone = self.provider.clone_for_chapter(chapter)
+            slot_name = clone.get_slot_name()
+            with self.lock:
+                job = self.jobs.get(slot_name)
+                if job is not None and job["thread"].is_alive():
+                    continue
+                if clone.is_slot_complete():
+                    continue
+                job = {"clone": clone, "thread": None, "result": None, "progress_queue": Queue()}
+                job["thread"] = threading.Thread(target=self._run_job, args=(job,), daemon=True)
+                self.jobs[slot_name] = job
+            print(f"Prefetching chapter {clone.get_chapter()} into slot {slot_name} ...")
+            job["thread"].start()
+
+    @staticmethod
+    def _run_job(job):
+        clone = job["clone"]
+        try:
+            if clone._restore_from_cache():
+                job["result"] = True
+            elif clone.update_current_url():
+                job["result"] = clone._handle_cache_result(clone.cache_current_chapter(), job["progress_queue"])
+            else:
+                job["result"] = False
+        except Exception as e:
+            print(f"Prefetching chapter {clone.get_chapter()} failed: {e}")
+            job["result"] = False
+        print(f"Prefetch of chapter {clone.get_chapter()} done, result: {job['result']}")
+
+    def take(self, slot_name: str, progress_queue=None):
+        """Waits for a running prefetch of the slot and returns its clone if it was successful, None otherwise."""
+        with self.lock:
+            job = self.jobs.pop(slot_name, None)
+        if job is None:
+            return None
+        while job["thread"].is_alive():
+            try:
+                progress = job["progress_queue"].get(timeout=0.1)
+                if progress_queue:
+                    progress_queue.put(progress)
+            except Empty:
+                continue
+        return job["clone"] if job["result"] and job["clone"].is_slot_complete() else None
+
+    def set_num_workers(self, num_workers: int):
+        """Prefetches that haven't started downloading yet use the new limit."""
+        with self.lock:
+            for job in self.jobs.values():
+                job["clone"].num_workers = num_workers
+
+    def is_busy(self, slot_name: str):
+        with self.lock:
+            job = self.jobs.get(slot_name)
+            return job is not None and job["thread"].is_alive()
+
+    def forget(self, slot_name: str):
+        with self.lock:
+            job = self.jobs.get(slot_name)
+            if job is not None and not job["thread"].is_alive():
+                del self.jobs[slot_name]
+
+
 class AutoProviderPlugin(ABC):
+    robots_cache = RobotsCache()  # In memory until the app sets a persistent one
+    chapter_index_max_age = 6 * 60 * 60  # Seconds until the chapter list of a series gets fetched again
+
     def __init__(self, title: str, chapter: int, chapter_rate: float, data_folder: str, cache_folder: str,
                  provider: str, specific_provider_website: str, logo_path: str, num_workers: int = 10):
         self.title = title
@@ -56,9 +141,25 @@ class AutoProviderPlugin(ABC):
         self.total_images = 0
         self.download_progress_queue = Queue()
         self.process_progress_queue = Queue()
-        self.session = Session()  # Create a session for connection pooling
+        self.session = HttpClient.get_instance()  # Shared by all providers for connection pooling
         self.clipping_space = None
-        self.num_workers = num_workers
+        self.num_workers = num_workers  # Max connections per host while downloading
+        self.max_retries = 4
+        self.retry_backoff = 0.5
+        self.max_retry_delay = 30.0
+        self.download_timeout = 20
+        self.failed_pages = []
+        self.page_ready_callback = None  # Gets (slot name, file path) of every page once it's downloaded, off-thread
+        self.download_done_callback = None  # Gets (slot name, failed pages) of every finished chapter, off-thread
+        self.first_page_ready = threading.Event()
+        self.stream_pages = True  # Return from loading once the first page is there
+        self.download_threads = {}
+        self.slots_folder = os.path.join(cache_folder, "slots")
+        self.download_folder = None
+        self.current_slot_name = self.get_slot_name() if self.is_slot_complete() else None
+        self.prefetcher = ChapterPrefetcher(self)
+        self.chapter_cache = None
+        self.url_cache = None
 
     @staticmethod
     def urlify(to_url: str):
@@ -117,9 +218,129 @@ class AutoProviderPlugin(ABC):
             self.chapter = int(self.chapter) if float(self.chapter).is_integer() else self.chapter
             self.chapter_str = str(self.chapter).replace(".", "-")
 
-    def next_chapter(self, progress_queue=None):
-        self.chapter += self.chapter_rate
+    @staticmethod
+    def chapter_to_str(chapter):
+        chapter = int(chapter) if float(chapter).is_integer() else chapter
+        return str(chapter).replace(".", "-")
+
+    def get_provider_name(self):
+        return type(self).__name__.replace("AutoProviderPlugin", "") or "Provider"
+
+    def get_slot_name(self, chapter=None):
+        chapter_str = self.chapter_str if chapter is None else self.chapter_to_str(chapter)
+        title = "-".join(self.url_title.lower().split()) or "untitled"
+        return f"{self.get_provider_name()}_{title}_{chapter_str}"
+
+    def get_slot_folder(self, chapter=None):
+        return os.path.join(self.slots_folder, self.get_slot_name(chapter))
+
+    def is_slot_complete(self, chapter=None):
+        return os.path.isfile(os.path.join(self.get_slot_folder(chapter), ".complete"))
+
+    def set_chapter_cache(self, chapter_cache):
+        self.chapter_cache = chapter_cache
+
+    def set_url_cache(self, url_cache):
+        self.url_cache = url_cache
+
+    @staticmethod
+    def get_content_files(folder: str, allowed_file_formats: tuple = (".png", ".jpg", ".jpeg", ".webp")):
+        return sorted(f for f in os.listdir(folder) if f.lower().endswith(allowed_file_formats))
+
+    def get_current_cache_folder(self):
+        """The folder whose content should currently be shown, falls back to the plain cache folder."""
+        if self.current_slot_name is not None:
+            folder = os.path.join(self.slots_folder, self.current_slot_name)
+            if os.path.isdir(folder):
+                return folder
+        return self.cache_folder
+
+    def clone_for_chapter(self, chapter):
+        clone = copy.copy(self)
+        clone.image_queue = Queue()
+        clone.download_progress_queue = Queue()
+        clone.process_progress_queue = Queue()
+        clone.current_url = None
+        clone.download_folder = None
+        clone.prefetcher = None
+        clone.page_ready_callback = None
+        clone.download_done_callback = None
+        clone.first_page_ready = threading.Event()
+        clone.stream_pages = False
+        clone.download_threads = {}
+        clone.failed_pages = []
+        clone.chap(chapter)
+        return clone
+
+    def set_num_workers(self, num_workers: int):
+        """Changes the connections per host for this provider and its prefetches, running downloads keep theirs."""
+        self.num_workers = num_workers
+        if self.prefetcher is not None:
+            self.prefetcher.set_num_workers(num_workers)
+
+    def prefetch_neighbours(self):
+        """Starts loading the next and the previous chapter in the background and drops all other slots."""
+        if self.prefetcher is None:
+            return
+        neighbours = [chapter for chapter in (self.get_neighbour_chapter(1, fetch=False),
+                                              self.get_neighbour_chapter(-1, fetch=False)) if chapter is not None]
+        self._prune_slots([self.get_slot_name()] + [self.get_slot_name(chapter) for chapter in neighbours])
+        self.prefetcher.prefetch(neighbours)
+
+    def _prune_slots(self, keep: list):
+        if not os.path.isdir(self.slots_folder):
+            return
+        for slot_name in os.listdir(self.slots_folder):
+            if (slot_name in keep or self.is_downloading(slot_name)
+                    or (self.prefetcher is not None and self.prefetcher.is_busy(slot_name))):
+                continue
+            shutil.rmtree(os.path.join(self.slots_folder, slot_name), ignore_errors=True)
+            if self.prefetcher is not None:
+                self.prefetcher.forget(slot_name)
+
+    def _use_slot(self, progress_queue=None):
+        """Switches to an already downloaded (or currently prefetching) slot of the current chapter if possible."""
+        slot_name = self.get_slot_name()
+        self._wait_for_download(slot_name)
+        clone = self.prefetcher.take(slot_name, progress_queue) if self.prefetcher is not None else None
+        if clone is not None:
+            self.current_url = clone.get_current_url()
+        elif self.is_slot_complete():
+            with open(os.path.join(self.get_slot_folder(), ".complete"), "r") as f:
+                self.current_url = f.read().strip() or self.current_url
+        else:
+            return False
+        print(f"Using prefetched slot {slot_name}")
+        self.current_slot_name = slot_name
+        if progress_queue:
+            progress_queue.put(100)
+        return True
+
+    def _restore_from_cache(self, progress_queue=None):
+        """Puts the current chapter into its slot from the persistent chapter cache, without touching the network."""
+        if self.chapter_cache is None:
+            return False
+        folder = self.get_slot_folder()
+        url = self.chapter_cache.restore(self.get_provider_name(), self.url_title, self.chapter_str, folder)
+        if url is None:
+            return False
+        with open(os.path.join(folder, ".complete"), "w") as f:
+            f.write(url)
+        self.current_url = url
+        self.current_slot_name = self.get_slot_name()
+        if progress_queue:
+            progress_queue.put(100)
+        return True
+
+    def restore_chapter(self, progress_queue=None):
+        """Shows the current chapter if it is available locally (prefetched slot or chapter cache)."""
         self.chap()
+        return self._use_slot(progress_queue) or self._restore_from_cache(progress_queue)
+
+    def load_chapter(self, chapter, progress_queue=None):
+        self.chap(chapter)
+        if self._use_slot(progress_queue) or self._restore_from_cache(progress_queue):
+            return True
         if self.update_current_url():
             return self._handle_cache_result(self.cache_current_chapter(), progress_queue)
         else:
@@ -127,18 +348,65 @@ class AutoProviderPlugin(ABC):
                 progress_queue.put(0)
             return False
 
-    def previous_chapter(self, progress_queue=None):
-        self.chapter -= self.chapter_rate
-        self.chap()
-        if self.update_current_url():
-            return self._handle_cache_result(self.cache_current_chapter(), progress_queue)
-        else:
+    def _get_chapter_list(self) -> Optional[list]:  # Overwrite this if the provider can list all chapters
+        """Returns [(chapter number, url), ...] of every available chapter of the series, None if unsupported."""
+        return None
+
+    def get_chapter_index(self, fetch: bool = True, refresh: bool = False) -> Optional[ChapterIndex]:
+        """The chapter index of the series, it only gets fetched if there is no stored one or it is outdated."""
+        provider_name = self.get_provider_name()
+        if self.url_cache is not None and not refresh:
+            chapter_index = self.url_cache.get_chapter_index(provider_name, self.url_title, self.chapter_index_max_age)
+            if chapter_index is not None:
+                return chapter_index
+        if not fetch:
+            return None
+        try:
+            chapters = self._get_chapter_list()
+        except Exception as e:
+            print(f"Could not get the chapter list of {self.title}: {e}")
+            return None
+        if not chapters:
+            return None
+        if self.url_cache is not None:
+            return self.url_cache.store_chapter_index(provider_name, self.url_title, chapters)
+        return ChapterIndex(chapters)
+
+    def get_neighbour_chapter(self, direction: int, fetch: bool = True):
+        """
+        The next (direction 1) or previous (direction -1) chapter. Without a chapter index it is chapter_rate away,
+        with one it is the actual neighbour and None if there is none.
+        """
+        chapter_index = self.get_chapter_index(fetch)
+        if chapter_index is None:
+            return self.chapter + direction * self.chapter_rate
+        if direction > 0:
+            chapter = chapter_index.next(self.chapter)
+            if chapter is None and fetch:  # A new chapter may have come out since the index was fetched
+                chapter_index = self.get_chapter_index(refresh=True)
+                chapter = chapter_index.next(self.chapter) if chapter_index is not None else None
+            return chapter
+        return chapter_index.previous(self.chapter)
+
+    def _load_neighbour_chapter(self, direction: int, progress_queue=None):
+        chapter = self.get_neighbour_chapter(direction)
+        if chapter is None:
+            print(f"There is no {'next' if direction > 0 else 'previous'} chapter of {self.title}")
             if progress_queue:
                 progress_queue.put(0)
             return False
+        return self.load_chapter(chapter, progress_queue)
+
+    def next_chapter(self, progress_queue=None):
+        return self._load_neighbour_chapter(1, progress_queue)
+
+    def previous_chapter(self, progress_queue=None):
+        return self._load_neighbour_chapter(-1, progress_queue)
 
     def reload_chapter(self, progress_queue=None):
         self.chap()
+        if self.prefetcher is not None:
+            self.prefetcher.take(self.get_slot_name())  # Don't download into a slot that is still being prefetched
         if self.update_current_url():
             return self._handle_cache_result(self.cache_current_chapter(), progress_queue)
         else:
@@ -148,7 +416,13 @@ class AutoProviderPlugin(ABC):
 
     def _handle_cache_result(self, cache_gen, progress_queue):
         final_result = None
-        for progress_or_result in cache_gen:
+        while True:
+            try:
+                progress_or_result = next(cache_gen)
+            except StopIteration as e:  # The generator returns its final result
+                if e.value is not None:
+                    final_result = e.value
+                break
             # print("Handle cache result got: ", progress_or_result) # Debug
             if isinstance(progress_or_result, bool):  # Check if it's the final result
                 final_result = progress_or_result
@@ -161,6 +435,7 @@ class AutoProviderPlugin(ABC):
         return final_result
 
     def _download_logo_image(self, url_or_data: str, new_name: str, img_format: str, img_type: Optional[str] = None):
+        from aplustools.data.imagetools import OnlineImage
         image = OnlineImage(url_or_data)
         if img_type.lower() == "url":
             image.download_image(self.data_folder, url_or_data, new_name, img_format)
@@ -169,19 +444,62 @@ class AutoProviderPlugin(ABC):
 
     def redo_prep(self):
         self._empty_cache()
+        self.current_slot_name = None
+        from PIL import Image
         image = Image.open(f"{self.data_folder}/empty.png")
         image.save(f"{self.cache_folder}/empty.png")
 
     def update_current_url(self):
         print("Updating current URL...")
-        self.current_url = self._get_current_chapter_url()
+        with Tracer.get_instance().span("resolve url", chapter=self.chapter_str):
+            self.current_url = self._get_cached_chapter_url() or self._get_current_chapter_url()
         if self.current_url:
             print(f"Current URL set to: {self.current_url}")
+            if self.url_cache is not None:
+                self.url_cache.store_chapter_url(self.get_provider_name(), self.url_title, self.chapter_str,
+                                                 self.current_url)
             return True
         else:
             print("Failed to update current URL.")
             return False
 
+    def _get_cached_chapter_url(self):
+        """
+        The known url of the chapter or the one from the chapter index, otherwise one predicted from the url template
+        of the series, which only costs a HEAD request to check instead of a search.
+        """
+        if self.url_cache is None:
+            return None
+        provider_name = self.get_provider_name()
+        tracer = Tracer.get_instance()
+        url = self.url_cache.get_chapter_url(provider_name, self.url_title, self.chapter_str)
+        if url:
+            print("Found cached URL:" + url)
+            tracer.count("url cache hits")
+            return url
+        chapter_index = self.get_chapter_index()
+        url = chapter_index.get_url(self.chapter) if chapter_index is not None else None
+        if url:
+            print("Found URL in the chapter index:" + url)
+            tracer.count("url index hits")
+            return url
+        url = self.url_cache.predict_chapter_url(provider_name, self.url_title, self.chapter_str)
+        if url and self._get_url(url, f'chapter {self.chapter} {self.title.title()}'):
+            print("Predicted URL:" + url)
+            tracer.count("url predictions")
+            return url
+        tracer.count("url cache misses")
+        return None
+
+    def _get_series_url(self, find_series_url) -> Optional[str]:
+        """The url of the series from the url cache, find_series_url only gets called if it isn't known yet."""
+        url = self.url_cache.get_series_url(self.get_provider_name(), self.url_title) if self.url_cache else None
+        if url is None:
+            url = find_series_url()
+            if url and self.url_cache is not None:
+                self.url_cache.store_series_url(self.get_provider_name(), self.url_title, url)
+        return url
+
     def _get_current_chapter_url(self):
         provider_function = {
             "google": self._google_provider,
@@ -192,7 +510,8 @@ class AutoProviderPlugin(ABC):
         }.get(self.provider_type.lower())
 
         if provider_function:
-            return provider_function()
+            with Tracer.get_instance().span("search url", provider=self.provider_type):
+                return provider_function()
         else:
             print(f"Provider {self.provider_type} not supported.")
             return None
@@ -204,7 +523,7 @@ class AutoProviderPlugin(ABC):
         if inTitle is None or all([str(x).lower() in urlTitle.lower() for x in inTitle]):
             # Checking if the URL is accessible or leads to a 404 error
             try:
-                response = requests.head(url, allow_redirects=True)  # Using HEAD request to get the headers
+                response = HttpClient.get_instance().head(url, allow_redirects=True)  # Using HEAD request to get the headers
                 if response.status_code == 404:
                     print(f"The URL {url} leads to a 404 error, checking next result...")
                     return None
@@ -220,37 +539,19 @@ class AutoProviderPlugin(ABC):
                 print(f"The URL {url} cannot be crawled, checking next result...")
         return None
 
+    @classmethod
+    def set_robots_cache(cls, robots_cache: RobotsCache):
+        AutoProviderPlugin.robots_cache = robots_cache  # Shared by all providers
+
     @classmethod
     def is_crawlable(cls, useragent: str, url: str) -> bool:
         """
-        Check if the URL can be crawled by checking the robots.txt file of the website.
+        Check if the URL can be crawled by checking the robots.txt file of the website, it is only downloaded again
+        once the robots cache entry of the domain expired.
         """
         try:
-            domain = urlparse(url).netloc
-            robots_txt_url = urljoin(f'https://{domain}', '/robots.txt')
-
-            # Retrieve the robots.txt content
-            response = requests.get(robots_txt_url)
-
-            # If robots.txt exists, parse it
-            if response.status_code == 200:
-                lines = response.text.split('\n')
-                user_agent_section = False
-                for line in lines:
-                    if line.lower().startswith('user-agent'):
-                        if user_agent_section:
-                            break
-                        user_agent_section = any(ua.strip() == useragent.lower() for ua in line.split(':')[1:])
-                    elif user_agent_section and line.lower().startswith('disallow'):
-                        disallowed_path = line.split(':')[1].strip()
-                        if disallowed_path == '/' or url.startswith(disallowed_path) and disallowed_path != "":
-                            return False
-                if not user_agent_section and useragent != "*":
-                    return cls.is_crawlable("*", url)
-                return True
-            else:
-                # If robots.txt does not exist, assume everything is crawlable
-                return True
+            with Tracer.get_instance().span("robots check"):
+                return cls.robots_cache.is_allowed(useragent, url)
         except Exception as e:
             print(f"An error occurred while checking the robots.txt file: {e}")
             return False  # Return False if there was an error or the robots.txt file couldn't be retrieved
@@ -266,6 +567,7 @@ class AutoProviderPlugin(ABC):
             f'manga {self.title} site:{self.specific_provider_website}',
             f'manga site:{self.specific_provider_website}'
         ]
+        from aplustools.web.search import Search
         search = Search()
         return search.google_provider(queries)
 
@@ -277,6 +579,7 @@ class AutoProviderPlugin(ABC):
             f'manga {self.title} site:{self.specific_provider_website}',
             f'manga site:{self.specific_provider_website}'
         ]
+        from aplustools.web.search import Search
         search = Search()
         return search.duckduckgo_provider(queries)
 
@@ -288,6 +591,7 @@ class AutoProviderPlugin(ABC):
             f'manga {self.title} site:{self.specific_provider_website}',
             f'manga site:{self.specific_provider_website}'
         ]
+        from aplustools.web.search import Search
         search = Search()
         return search.bing_provider(queries)
 
@@ -302,48 +606,147 @@ class AutoProviderPlugin(ABC):
     def get_search_results(self, text):  # Can't be generalized, you need to overwrite this
         return False  # Could also return None, but stick to bool for this method
 
-    def _empty_cache(self):
-        files = os.listdir(self.cache_folder)
-        for f in files:
-            os.remove(f"{self.cache_folder}/{f}")
+    def _empty_cache(self, folder: Optional[str] = None, keep_partial: bool = False):
+        folder = folder or self.cache_folder
+        for f in os.listdir(folder):
+            if keep_partial and f.endswith(".part"):  # Unfinished downloads get resumed
+                continue
+            if os.path.isfile(os.path.join(folder, f)):
+                os.remove(os.path.join(folder, f))
+
+    def _get_retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Exponential backoff with jitter, a Retry-After header (seconds or http date) takes precedence."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_retry_delay)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    return min(max(delay, 0.0), self.max_retry_delay)
+                except (TypeError, ValueError):
+                    pass
+        return min(self.retry_backoff * (2 ** attempt), self.max_retry_delay) * random.uniform(0.5, 1.0)
 
-    async def _download_image_async(self, session, img_tag, new_name):
-        timer = TimidTimer()
+    @staticmethod
+    def _get_expected_range(response) -> tuple:
+        """
+        Where the body starts in the file and how big the finished file is, from Content-Range for a 206 and from
+        Content-Length otherwise. The size is None if it isn't known, e.g. for compressed or chunked bodies.
+        """
+        if response.status == 206:
+            match = re.match(r"bytes (\d+)-\d+/(\d+|\*)", response.headers.get("Content-Range", ""))
+            if match is None:
+                return -1, None  # Can't tell where this part belongs
+            return int(match.group(1)), int(match.group(2)) if match.group(2) != "*" else None
+        length = response.headers.get("Content-Length")
+        if length is None or not length.isdigit() or response.headers.get("Content-Encoding", "identity") != "identity":
+            return 0, None
+        return 0, int(length)
+
+    async def _download_image_async(self, session, limit, img_tag, new_name):
+        """
+        Downloads one page into a .part file and renames it once it is complete. Connection errors, timeouts, 429 and
+        5xx responses are retried with backoff, a partial file is resumed with a Range request.
+        Returns the file name or None if the page could not be downloaded.
+        """
+        import aiohttp
+        import aiofiles
+        span = Tracer.get_instance().span("download image", concurrent=True, page=new_name).start()
         url = urljoin(self.current_url, img_tag['src'])
-        async with session.get(url) as response:
-            if response.status == 200:
-                content = await response.read()
-                file_extension = img_tag['src'].split(".")[-1]
-                file_name = f"{new_name}.{file_extension}"
-                file_path = os.path.join(self.cache_folder, file_name)
-                async with aiofiles.open(file_path, 'wb') as f:
-                    await f.write(content)
-                print(timer.end(), "IMGTI")
-                self.downloaded_images_count += 1
-                progress = int((self.downloaded_images_count / self.total_images) * 100)
-                self.download_progress_queue.put(progress)
-                return file_name
-        return img_tag['src'].split("/")[-1]
+        file_extension = img_tag['src'].split(".")[-1]
+        file_name = f"{new_name}.{file_extension}"
+        file_path = os.path.join(self.download_folder, file_name)
+        part_path = file_path + ".part"
+        timeout = aiohttp.ClientTimeout(total=None, connect=self.download_timeout, sock_read=self.download_timeout)
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            retry_after = None
+            try:
+                async with limit, session.get(url, headers=headers, timeout=timeout) as response:
+                    if response.status == 416 and offset:  # The partial file is useless, start over
+                        os.remove(part_path)
+                        error = "Range not satisfiable"
+                        continue
+                    if response.status == 429 or response.status >= 500:
+                        error = f"HTTP {response.status}"
+                        retry_after = response.headers.get("Retry-After")
+                    elif response.status not in (200, 206):
+                        error = f"HTTP {response.status}"
+                        break
+                    else:
+                        start, expected_size = self._get_expected_range(response)
+                        if start not in (0, offset):  # Not the range that was asked for, start over
+                            if os.path.isfile(part_path):
+                                os.remove(part_path)
+                            error = f"Unexpected range {response.headers.get('Content-Range')} for offset {offset}"
+                            continue
+                        mode = "ab" if start else "wb"  # Servers may ignore the Range header
+                        async with aiofiles.open(part_path, mode) as f:
+                            async for chunk in response.content.iter_chunked(64 * 1024):
+                                await f.write(chunk)
+                        size = os.path.getsize(part_path)
+                        if expected_size is not None and size != expected_size:
+                            if size > expected_size:  # Can't be resumed
+                                os.remove(part_path)
+                            error = f"Incomplete body ({size} of {expected_size} bytes)"
+                            continue
+                        os.replace(part_path, file_path)
+                        span.finish(attempts=attempt + 1, bytes=os.path.getsize(file_path))
+                        if self.page_ready_callback is not None:
+                            self.page_ready_callback(self.get_slot_name(), file_path)
+                        if new_name == "000":
+                            self.first_page_ready.set()
+                        self._advance_download_progress()
+                        return file_name
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            if attempt < self.max_retries:
+                Tracer.get_instance().count("download retries")
+                delay = self._get_retry_delay(attempt, retry_after)
+                print(f"Page {new_name} failed ({error}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        print(f"Giving up on page {new_name} ({url}): {error}")
+        span.finish(attempts=self.max_retries + 1, error=error)
+        Tracer.get_instance().count("failed pages")
+        self._advance_download_progress()
+        return None
+
+    def _advance_download_progress(self):
+        self.downloaded_images_count += 1
+        progress = int((self.downloaded_images_count / self.total_images) * 100)
+        self.download_progress_queue.put(progress)
 
     async def download_images_async(self, validated_tags):
-        total_images = len(validated_tags)
-        count = 0
-        async with aiohttp.ClientSession() as session:
-            tasks = []
-            for img_tag in validated_tags:
-                new_image_name = f"{str(count).zfill(3)}"
-                task = asyncio.create_task(
-                    self._download_image_async(session, img_tag, new_image_name))
-                tasks.append(task)
-                count += 1
-
-            results = await asyncio.gather(*tasks)
-            print(f"{len(validated_tags)} images downloaded!")
-            return results
+        """
+        Downloads all pages, at most num_workers connections per host are open at the same time. The limit is shared
+        with the downloads of the other chapters through the HttpClient.
+        """
+        session = await self.session.get_async_session()
+        tasks = []
+        for count, img_tag in enumerate(validated_tags):
+            new_image_name = f"{str(count).zfill(3)}"
+            host = urlparse(urljoin(self.current_url, img_tag['src'])).netloc
+            limit = self.session.get_host_limit(host, self.num_workers)
+            task = asyncio.create_task(
+                self._download_image_async(session, limit, img_tag, new_image_name))
+            tasks.append(task)
+
+        results = await asyncio.gather(*tasks)
+        print(f"{sum(result is not None for result in results)}/{len(validated_tags)} images downloaded!")
+        return results
 
     def download_images(self):
+        self.failed_pages = []
+        tracer = Tracer.get_instance()
         try:
-            response = requests.get(self.current_url)
+            with tracer.span("fetch chapter page"):
+                response = self.session.get(self.current_url, timeout=self.download_timeout)
+            if not response.ok and self.url_cache is not None:  # Don't keep using a url that stopped working
+                self.url_cache.forget_chapter_url(self.get_provider_name(), self.url_title, self.chapter_str)
             response.raise_for_status()
             soup = BeautifulSoup(response.text, 'html.parser')
             img_tags = soup.find_all('img')
@@ -353,37 +756,76 @@ class AutoProviderPlugin(ABC):
             self.total_images = len(validated_tags)
 
             self.downloaded_images_count = 0
-            download_result = asyncio.run(self.download_images_async(validated_tags))
+            with tracer.span("download images", pages=self.total_images):
+                download_result = self.session.run(self.download_images_async(validated_tags))
 
-            return True
+            self.failed_pages = [(page, urljoin(self.current_url, img_tag['src']))
+                                 for page, (img_tag, result) in enumerate(zip(validated_tags, download_result))
+                                 if result is None]
+            if self.failed_pages:
+                print(f"{len(self.failed_pages)} page(s) failed: "
+                      + ", ".join(f"{page} ({url})" for page, url in self.failed_pages))
+            return len(self.failed_pages) < len(validated_tags) or not validated_tags
 
         except Exception as e:
             print(f"An error occurred: {e}")
             return False
 
     def validate_image(self, image):
-        timer = TimidTimer()
         file_name, file_extension, *_ = image.rsplit(".", maxsplit=1) + ["", ""]
         new_name = file_name.zfill(3)
-        if file_name.isdigit():
-            print(timer.end(), "VALT")
-            return file_name, file_extension, new_name, True
-        print(timer.end(), "VALF")
-        return file_name, file_extension, new_name, False
+        return file_name, file_extension, new_name, file_name.isdigit()
+
+    def _download_chapter(self):
+        """Downloads the current chapter into its slot, only a fully downloaded chapter is marked complete and cached."""
+        download_result = self.download_images()
+        if download_result and not self.failed_pages:  # Incomplete chapters get downloaded again next time
+            with open(os.path.join(self.download_folder, ".complete"), "w") as f:
+                f.write(self.current_url)
+            if self.chapter_cache is not None:
+                self.chapter_cache.store(self.get_provider_name(), self.url_title, self.chapter_str,
+                                         self.download_folder, self.current_url,
+                                         self.get_content_files(self.download_folder))
+        # A streamed chapter is already shown when this finishes, so the missing pages are reported separately
+        if self.download_done_callback is not None:
+            self.download_done_callback(self.get_slot_name(), list(self.failed_pages))
+        return download_result
+
+    def is_downloading(self, slot_name: str):
+        thread = self.download_threads.get(slot_name)
+        return thread is not None and thread.is_alive()
+
+    def _wait_for_download(self, slot_name: str):
+        thread = self.download_threads.pop(slot_name, None)
+        if thread is not None:
+            thread.join()
 
     def cache_current_chapter(self):
-        timer = TimidTimer()
+        tracer = Tracer.get_instance()
+        span = tracer.span("cache chapter", chapter=self.chapter_str).start()
         if not self.current_url:
             print("URL nor found.")
+            span.finish(result=False)
             yield 0
             return False
-        self._empty_cache()
+        slot_name = self.get_slot_name()
+        self._wait_for_download(slot_name)  # Never download into a slot twice at the same time
+        self.download_folder = self.get_slot_folder()
+        os.makedirs(self.download_folder, exist_ok=True)
+        self._empty_cache(self.download_folder, keep_partial=True)
+
+        # The download runs on its own copy, so it can keep streaming pages in after we return
+        downloader = self.clone_for_chapter(self.chapter)
+        downloader.current_url = self.current_url
+        downloader.download_folder = self.download_folder
+        downloader.page_ready_callback = self.page_ready_callback
+        downloader.download_done_callback = self.download_done_callback
 
-        timer2 = TimidTimer()
         download_result_queue = Queue()
-        download_thread = threading.Thread(target=lambda q=download_result_queue: q.put(self.download_images()))
+        download_thread = threading.Thread(target=lambda q=download_result_queue: q.put(downloader._download_chapter()),
+                                           daemon=True)
         download_thread.start()
-        print(timer2.end(), "STRTUP")
+        self.download_threads[slot_name] = download_thread
 
         current_download_progress = 0
         combined_progress = 0
@@ -391,25 +833,33 @@ class AutoProviderPlugin(ABC):
         yield 0
 
         while True:
-            if not download_thread.is_alive() and self.download_progress_queue.empty():
+            if not download_thread.is_alive() and downloader.download_progress_queue.empty():
                 break
+            if self.stream_pages and downloader.first_page_ready.is_set():
+                print(f"First page of {slot_name} is ready, streaming the rest")
+                self.current_slot_name = slot_name
+                span.finish(result="streaming")
+                return True
 
             # Handle download progress
-            if not self.download_progress_queue.empty():
-                new_download_progress = self.download_progress_queue.get()
+            if not downloader.download_progress_queue.empty():
+                new_download_progress = downloader.download_progress_queue.get()
                 progress_diff = new_download_progress - current_download_progress
                 combined_progress += progress_diff
                 current_download_progress = new_download_progress
 
             yield combined_progress // 2
-            time.sleep(0.1)
+            time.sleep(0.05)
 
         download_result = download_result_queue.get()
+        self.failed_pages = downloader.failed_pages
         print("DOWNLOAD RESULT", download_result)
+        if download_result:
+            self.current_slot_name = slot_name
 
         print("Cache current chapter done, returning now")
         print("Download Thread alive: " + str(download_thread.is_alive()))
-        print(timer.end(), "FULL")
+        span.finish(result=download_result)
         return download_result
 
 
@@ -449,7 +899,7 @@ class AutoProviderBaseLike(AutoProviderPlugin):
         }
 
         # Send the first POST request
-        response = requests.post(url, headers=headers, data=data)
+        response = self.session.post(url, headers=headers, data=data)
 
         # Check for a successful response (HTTP status code 200)
         if response.status_code == 200:
@@ -464,7 +914,7 @@ class AutoProviderBaseLike(AutoProviderPlugin):
         base_url = self.specific_provider_website
         search_url = f"https://{base_url}?s={text}&post_type=wp-manga"
 
-        response = requests.get(search_url)
+        response = self.session.get(search_url)
         response.raise_for_status()
 
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -491,8 +941,8 @@ class AutoProviderBaseLike(AutoProviderPlugin):
         return search_results
 
     def _direct_provider(self):
-        response_data = self._search()
-        url = self._get_url(response_data["data"][0]["url"] + f"chapter-{self.chapter_str}/",
+        series_url = self._get_series_url(lambda: self._search()["data"][0]["url"])
+        url = self._get_url(series_url + f"chapter-{self.chapter_str}/",
                             f'chapter {self.chapter} {self.title.title()}')
         if url:
             print("Found URL:" + url)  # Concatenate (add-->+) string, to avoid breaking timestamps
@@ -554,7 +1004,7 @@ class AutoProviderBaseLike2(AutoProviderBaseLike):
         }
 
         # Send the first POST request
-        response = requests.post(url, headers=headers, data=data)
+        response = self.session.post(url, headers=headers, data=data)
 
         # Check for a successful response (HTTP status code 200)
         if response.status_code == 200:
@@ -566,8 +1016,8 @@ class AutoProviderBaseLike2(AutoProviderBaseLike):
         return None
 
     def _direct_provider(self):
-        response_data = self._search()
-        url = self._get_url(response_data["data"][0]["url"] + f"chapter-{self.chapter_str}/",
+        series_url = self._get_series_url(lambda: self._search()["data"][0]["url"])
+        url = self._get_url(series_url + f"chapter-{self.chapter_str}/",
                             f'chapter {self.chapter} {self.title.title()}')
         if url:
             print("Found URL:" + url)  # Concatenate (add-->+) string, to avoid breaking timestamps
@@ -623,7 +1073,7 @@ class AutoProviderBaseLike3(AutoProviderBaseLike):
         }
 
         # Send the first POST request
-        response = requests.post(url, headers=headers, data=data)
+        response = self.session.post(url, headers=headers, data=data)
 
         # Check for a successful response (HTTP status code 200)
         if response.status_code == 200:
@@ -634,11 +1084,17 @@ class AutoProviderBaseLike3(AutoProviderBaseLike):
             print(f'Error: {response.status_code}')
         return None
 
-    def _direct_provider(self):
+    def _find_series_url(self):
         response_data = self._search()
         if response_data and "data" in response_data and len(response_data["data"]) > 0:
-            first_result_url = response_data["data"][0].get("url_story", "") + f"chapter-{self.chapter_str}/"
-            url = self._get_url(first_result_url, f'chapter {self.chapter} {self.title.title()}')
+            return response_data["data"][0].get("url_story") or None
+        return None
+
+    def _direct_provider(self):
+        series_url = self._get_series_url(self._find_series_url)
+        if series_url:
+            url = self._get_url(series_url + f"chapter-{self.chapter_str}/",
+                                f'chapter {self.chapter} {self.title.title()}')
             if url:
                 print(f"Found URL: {url}")  # Using f-string for better readability
                 return url
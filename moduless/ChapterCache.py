@@ -0,0 +1,171 @@
+from typing import Optional
+import threading
+import hashlib
+import sqlite3
+import shutil
+import time
+import os
+
+
+class ChapterCache:
+    """
+    Persistent on-disk cache of downloaded chapters, keyed by (provider, title, chapter).
+    Images are stored once under their content hash in objects/, a small SQLite index keeps the page order of every
+    chapter and when it was last used. If the store grows above max_size bytes the least recently used chapters are
+    evicted.
+    """
+    def __init__(self, path: str, max_size: int = 500 * 1024 * 1024):
+        self.path = path
+        self.objects_folder = os.path.join(path, "objects")
+        os.makedirs(self.objects_folder, exist_ok=True)
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(path, "index.db"), check_same_thread=False)
+        self.cursor = self.conn.cursor()
+        self.cursor.executescript("""
+            CREATE TABLE IF NOT EXISTS chapters (
+                key TEXT PRIMARY KEY, provider TEXT, title TEXT, chapter TEXT, url TEXT, last_access REAL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT, page INTEGER, hash TEXT, ext TEXT, PRIMARY KEY (key, page)
+            );
+            CREATE TABLE IF NOT EXISTS objects (hash TEXT PRIMARY KEY, ext TEXT, size INTEGER);
+            CREATE INDEX IF NOT EXISTS chapters_last_access ON chapters (last_access);
+            CREATE INDEX IF NOT EXISTS pages_hash ON pages (hash);
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(provider: str, title: str, chapter: str) -> str:
+        return f"{provider}|{' '.join(title.lower().split())}|{chapter}"
+
+    def set_max_size(self, max_size: int):
+        self.max_size = max_size
+        self.evict()
+
+    def _object_path(self, file_hash: str, ext: str) -> str:
+        return os.path.join(self.objects_folder, file_hash[:2], f"{file_hash}.{ext}")
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    @staticmethod
+    def _link(source: str, destination: str):
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(source, destination)  # Hardlinks cost no extra disk space
+        except OSError:
+            shutil.copyfile(source, destination)
+
+    def store(self, provider: str, title: str, chapter: str, folder: str, url: str, content_files: list):
+        """Adds the (already downloaded) content files of a chapter folder to the cache, in page order."""
+        key = self.make_key(provider, title, chapter)
+        pages = []
+        try:
+            for page, file_name in enumerate(sorted(content_files)):
+                source = os.path.join(folder, file_name)
+                ext = file_name.rsplit(".", 1)[-1].lower()
+                file_hash = self._hash_file(source)
+                object_path = self._object_path(file_hash, ext)
+                if not os.path.isfile(object_path):
+                    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                    self._link(source, object_path)
+                pages.append((key, page, file_hash, ext, os.path.getsize(object_path)))
+        except OSError as e:
+            print(f"Could not add chapter {chapter} of {title} to the cache: {e}")
+            return False
+
+        with self.lock:
+            self.cursor.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self.cursor.executemany("INSERT OR IGNORE INTO objects (hash, ext, size) VALUES (?, ?, ?)",
+                                    [(file_hash, ext, size) for _, _, file_hash, ext, size in pages])
+            self.cursor.executemany("INSERT INTO pages (key, page, hash, ext) VALUES (?, ?, ?, ?)",
+                                    [page[:4] for page in pages])
+            self.cursor.execute("INSERT OR REPLACE INTO chapters (key, provider, title, chapter, url, last_access) "
+                                "VALUES (?, ?, ?, ?, ?, ?)", (key, provider, title, chapter, url, time.time()))
+            self.conn.commit()
+        print(f"Cached chapter {chapter} of {title} ({len(pages)} pages)")
+        self.evict(keep=(key,))
+        return True
+
+    def restore(self, provider: str, title: str, chapter: str, folder: str) -> Optional[str]:
+        """Puts a cached chapter into folder and returns its url, returns None if the chapter isn't cached."""
+        key = self.make_key(provider, title, chapter)
+        with self.lock:
+            self.cursor.execute("SELECT url FROM chapters WHERE key = ?", (key,))
+            row = self.cursor.fetchone()
+            if row is None:
+                return None
+            url = row[0]
+            self.cursor.execute("SELECT page, hash, ext FROM pages WHERE key = ? ORDER BY page", (key,))
+            pages = self.cursor.fetchall()
+        if not pages or not all(os.path.isfile(self._object_path(file_hash, ext)) for _, file_hash, ext in pages):
+            self.remove(key)  # Objects went missing, so the entry is useless
+            return None
+
+        os.makedirs(folder, exist_ok=True)
+        for page, file_hash, ext in pages:
+            self._link(self._object_path(file_hash, ext), os.path.join(folder, f"{str(page).zfill(3)}.{ext}"))
+        with self.lock:
+            self.cursor.execute("UPDATE chapters SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        print(f"Restored chapter {chapter} of {title} from the cache")
+        return url
+
+    def remove(self, key: str):
+        with self.lock:
+            self.cursor.execute("DELETE FROM chapters WHERE key = ?", (key,))
+            self.cursor.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self._remove_orphans()
+            self.conn.commit()
+
+    def _remove_orphans(self):
+        self.cursor.execute("SELECT hash, ext FROM objects WHERE hash NOT IN (SELECT hash FROM pages)")
+        orphans = self.cursor.fetchall()
+        for file_hash, ext in orphans:
+            try:
+                os.remove(self._object_path(file_hash, ext))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Could not remove cached object {file_hash}: {e}")
+        self.cursor.executemany("DELETE FROM objects WHERE hash = ?", [(file_hash,) for file_hash, _ in orphans])
+
+    def get_size(self) -> int:
+        with self.lock:
+            self.cursor.execute("SELECT COALESCE(SUM(size), 0) FROM objects")
+            return self.cursor.fetchone()[0]
+
+    def evict(self, keep: tuple = ()):
+        """Drops the least recently used chapters until the cache fits into max_size again."""
+        with self.lock:
+            self.cursor.execute("SELECT COALESCE(SUM(size), 0) FROM objects")
+            size = self.cursor.fetchone()[0]
+            if size <= self.max_size:
+                return
+            self.cursor.execute("SELECT key FROM chapters ORDER BY last_access ASC")
+            candidates = [key for (key,) in self.cursor.fetchall() if key not in keep]
+            for key in candidates:
+                self.cursor.execute("DELETE FROM chapters WHERE key = ?", (key,))
+                self.cursor.execute("DELETE FROM pages WHERE key = ?", (key,))
+                self._remove_orphans()
+                self.cursor.execute("SELECT COALESCE(SUM(size), 0) FROM objects")
+                size = self.cursor.fetchone()[0]
+                print(f"Evicted {key} from the chapter cache, {size} bytes left")
+                if size <= self.max_size:
+                    break
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            try:
+                self.conn.commit()
+                self.conn.close()
+            except Exception as e:
+                print(f"Error closing the chapter cache: {e}")
@@ -2,29 +2,88 @@ from PySide6.QtWidgets import (QVBoxLayout, QHBoxLayout, QDialog, QLineEdit, QPu
                                QLabel, QScrollBar, QGroupBox, QFormLayout, QRadioButton, QCheckBox, QSpinBox,
                                QApplication, QProgressDialog, QWidget, QListWidget, QSizePolicy, QListWidgetItem,
                                QMessageBox, QStyledItemDelegate, QComboBox, QToolButton, QFileDialog, QLayout,
-                               QFontComboBox)
-from PySide6.QtCore import Qt, Signal, QThread, QTimer, Slot, QSize, QPropertyAnimation, QEasingCurve
-from PySide6.QtGui import QPainter, QBrush, QColor, QPen, QPalette, QIcon, QPixmap, QFont, QWheelEvent
+                               QFontComboBox, QTableWidget, QTableWidgetItem, QHeaderView)
+from PySide6.QtCore import (Qt, Signal, QThread, QTimer, Slot, QSize, QRect, QPropertyAnimation, QEasingCurve,
+                            QEvent, QObject, QRunnable, QThreadPool)
+from PySide6.QtGui import (QPainter, QBrush, QColor, QPen, QPalette, QIcon, QPixmap, QFont, QWheelEvent,
+                           QImageReader, QImage)
 from aplustools.io import environment as env
 from typing import Literal, Optional, List
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from collections import OrderedDict
 import threading
 import importlib
+import hashlib
 import sqlite3
+import inspect
 import random
 import ctypes
-import shutil
 import queue
 import json
 import time
 import os
-from aplustools.package.timid import TimidTimer
+
+from modules.HttpClient import HttpClient
+from modules.Tracing import Tracer
 
 
 class DBManager:
-    def __init__(self, path: str):
+    """
+    A sqlite connection that is set up the same way on every connect. WAL journaling with synchronous=NORMAL only
+    syncs on checkpoints instead of on every commit, busy_timeout (seconds) waits for other connections instead of
+    failing right away. Queries are built once, so sqlite3 can reuse their prepared statements.
+    """
+    def __init__(self, path: str, journal_mode: Optional[str] = "wal", synchronous: Optional[str] = "normal",
+                 busy_timeout: Optional[float] = None):
         self._path = path
-        self.conn = sqlite3.connect(path)
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.queries = {}  # (kind, table, columns) -> query
+        self.conn = self.cursor = None
+        self._open()
+
+    def _open(self):
+        self.conn = sqlite3.connect(self._path, timeout=self.busy_timeout if self.busy_timeout is not None else 5.0,
+                                    cached_statements=256)
         self.cursor = self.conn.cursor()
+        self.cursor.execute("PRAGMA foreign_keys = ON")  # Off by default, ON DELETE CASCADE needs it
+        if self.journal_mode is not None:
+            # Not every file system supports WAL (e.g. network shares), sqlite then keeps the old mode
+            mode = self.cursor.execute(f"PRAGMA journal_mode = {self.journal_mode}").fetchone()[0]
+            if mode.lower() != self.journal_mode.lower():
+                print(f"Could not switch {self._path} to {self.journal_mode} journaling, using {mode}")
+        if self.synchronous is not None:
+            self.cursor.execute(f"PRAGMA synchronous = {self.synchronous}")
+
+    def get_version(self) -> int:
+        return self.cursor.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self, migrations: list):
+        """
+        Brings the schema up to date. migrations[i] is a list of statements that turn version i into i + 1, each one
+        runs in its own transaction together with the version bump.
+        """
+        version = self.get_version()
+        for new_version, statements in enumerate(migrations[version:], start=version + 1):
+            try:
+                self.cursor.execute("BEGIN")
+                for statement in statements:
+                    self.cursor.execute(statement)
+                self.cursor.execute(f"PRAGMA user_version = {new_version}")
+                self.conn.commit()
+                print(f"Migrated {self._path} to version {new_version}")
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error migrating to version {new_version}: {e}")
+                return
+
+    def checkpoint(self):
+        """Moves everything from the WAL file into the database file, so copying the file copies everything."""
+        try:
+            self.cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            print(f"Error checkpointing the database: {e}")
 
     def create_table(self, table_name: str, columns: list):
         query = f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(columns)})"
@@ -59,6 +118,22 @@ class DBManager:
             except Exception as e:
                 print(f"Error updating info: {e}")
 
+    def upsert_many(self, table: str, rows: list, columns: list):
+        """Inserts or updates all rows in one transaction, the first column is the unique key."""
+        query = self.queries.get(("upsert", table, tuple(columns)))
+        if query is None:
+            updates = ', '.join(f"{column} = excluded.{column}" for column in columns[1:])
+            query = self.queries[("upsert", table, tuple(columns))] = (
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT({columns[0]}) DO UPDATE SET {updates}")
+        try:
+            with self.conn:  # Commits once at the end, rolls back if anything failed
+                self.cursor.executemany(query, rows)
+            return True
+        except Exception as e:
+            print(f"Error updating info: {e}")
+            return False
+
     def get_info(self, table: str, columns: list) -> list:
         query = f"SELECT {', '.join(columns)} FROM {table}"
         try:
@@ -70,14 +145,14 @@ class DBManager:
 
     def connect(self):
         try:
-            self.conn = sqlite3.connect(self._path)
-            self.cursor = self.conn.cursor()
+            self._open()
         except Exception as e:
             print(f"Error connection to the database: {e}")
 
     def close(self):
         try:
             self.conn.commit()
+            self.cursor.close()  # An open cursor keeps sqlite from removing the WAL file on close
             self.conn.close()
         except Exception as e:
             print(f"Error closing the database: {e}")
@@ -136,7 +211,7 @@ class AdvancedSettingsDialog(QDialog):
                                      "themes": {"light": "light_light", "dark": "dark", "font": "Segoe UI"},
                                      "settings_file_path": "",
                                      "settings_file_mode": "overwrite",
-                                     "misc": {"auto_export": False, "num_workers": 10}}
+                                     "misc": {"auto_export": False, "num_workers": 10, "max_cache_size_mb": 500, "image_memory_mb": 256, "scaled_cache_mb": 128, "tracing": False}}
         else:
             self.default_settings = default_settings
         if current_settings is None:
@@ -212,8 +287,32 @@ class AdvancedSettingsDialog(QDialog):
         self.workersSpinBox = QSpinBox(self.miscSettingsGroupBox)
         self.workersSpinBox.setRange(1, 20)
         self.workersSpinBox.setValue(10)
+        self.workersSpinBox.setToolTip("Maximum number of simultaneous downloads per host")
+        self.cacheSizeSpinBox = QSpinBox(self.miscSettingsGroupBox)
+        self.cacheSizeSpinBox.setRange(0, 100000)
+        self.cacheSizeSpinBox.setSuffix(" MB")
+        self.cacheSizeSpinBox.setValue(500)
+        self.imageMemorySpinBox = QSpinBox(self.miscSettingsGroupBox)
+        self.imageMemorySpinBox.setRange(16, 16384)
+        self.imageMemorySpinBox.setSuffix(" MB")
+        self.imageMemorySpinBox.setValue(256)
+        self.imageMemorySpinBox.setToolTip("How much memory loaded pages may use with lazy loading enabled")
+        self.scaledCacheSpinBox = QSpinBox(self.miscSettingsGroupBox)
+        self.scaledCacheSpinBox.setRange(0, 16384)
+        self.scaledCacheSpinBox.setSuffix(" MB")
+        self.scaledCacheSpinBox.setValue(128)
+        self.scaledCacheSpinBox.setToolTip("Memory for already scaled pages, so resizing doesn't rescale them again")
         self.miscSettingsLayout.addRow(self.autoExportCheckBox)
         self.miscSettingsLayout.addRow(QLabel("Number of Workers:"), self.workersSpinBox)
+        self.miscSettingsLayout.addRow(QLabel("Chapter Cache Size:"), self.cacheSizeSpinBox)
+        self.miscSettingsLayout.addRow(QLabel("Image Memory Budget:"), self.imageMemorySpinBox)
+        self.tracingCheckBox = QCheckBox("Record Performance Traces", self.miscSettingsGroupBox)
+        self.tracingCheckBox.setToolTip("Times downloads, decoding, scaling and layout, saved to trace.json on exit")
+        self.statsPushButton = QPushButton("Show Stats", self.miscSettingsGroupBox)
+        self.statsPushButton.clicked.connect(lambda: TraceStatsDialog(
+            self, self.master.chapter_cache if self.master is not None else None).exec())
+        self.miscSettingsLayout.addRow(QLabel("Scaled Image Cache:"), self.scaledCacheSpinBox)
+        self.miscSettingsLayout.addRow(self.tracingCheckBox, self.statsPushButton)
         self.mainLayout.addWidget(self.miscSettingsGroupBox)
 
         self.load_settings(self.current_settings)
@@ -269,54 +368,17 @@ class AdvancedSettingsDialog(QDialog):
         if not file_path:  # No file was selected
             return
 
-        if file_path.endswith(".db"):
-            self.replace_database(file_path)
-        elif file_path.endswith((".json", ".yaml")):
-            self.import_settings_from_json(file_path)
-
         if not self.master.settings.is_open:
             self.master.settings.connect()
+        if file_path.endswith(".db"):
+            self.master.settings.import_database(file_path)
+            self.master.library.setup()  # Older files have no library tables
+        elif file_path.endswith((".json", ".yaml", ".yml")):
+            self.master.settings.import_json(file_path)
         self.master.reload_window_title()
         self.master.reload_gui()
         self.reject()
 
-    def replace_database(self, new_db_path):
-        """Replace the existing settings database with a new one."""
-        temp_path = os.path.join(self.master.data_folder, "temp_data.db")
-        try:
-            # Safely attempt to replace the database
-            shutil.copyfile(new_db_path, temp_path)
-            os.remove(os.path.join(self.master.data_folder, "data.db"))
-            shutil.move(temp_path, os.path.join(self.master.data_folder, "data.db"))
-        except Exception as e:
-            print(f"Failed to replace the database: {e}")
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-
-    def import_settings_from_json(self, json_path):
-        """Import settings from a JSON file into the SQLite database."""
-        try:
-            with open(json_path, 'r') as file:
-                settings_data = json.load(file).get("settings")
-
-            db_path = os.path.join(self.master.data_folder, "data.db")
-            connection = sqlite3.connect(db_path)
-            cursor = connection.cursor()
-
-            # Assuming the table and columns for settings already exist and are named appropriately
-            for dic in settings_data:
-                key, value = dic["key"], dic["value"]
-                cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
-
-            connection.commit()
-        except json.JSONDecodeError:
-            print("Invalid JSON file.")
-        except Exception as e:
-            print(f"Error while importing settings from JSON: {e}")
-        finally:
-            cursor.close()
-            connection.close()
-
     def _format_theme_name(self, theme_name: str):
         """
         Formats the theme name by adding parentheses if needed and appending ' Theme' if the name includes 'light' or 'dark'.
@@ -366,6 +428,10 @@ class AdvancedSettingsDialog(QDialog):
 
         self.autoExportCheckBox.setChecked(settings.get("misc").get("auto_export") is True)
         self.workersSpinBox.setValue(settings.get("misc").get("num_workers"))
+        self.cacheSizeSpinBox.setValue(settings.get("misc").get("max_cache_size_mb", 500))
+        self.imageMemorySpinBox.setValue(settings.get("misc").get("image_memory_mb", 256))
+        self.scaledCacheSpinBox.setValue(settings.get("misc").get("scaled_cache_mb", 128))
+        self.tracingCheckBox.setChecked(settings.get("misc").get("tracing") is True)
 
     def revert_last_saved(self):
         # Logic to revert settings to the last saved state
@@ -405,7 +471,11 @@ class AdvancedSettingsDialog(QDialog):
             "settings_file_path": self.fileLocationLineEdit.text(),
             "settings_file_mode": "overwrite" if self.overwriteRadioButton.isChecked() else "modify" if self.modifyRadioButton.isChecked() else "create_new",
             "misc": {"auto_export": self.autoExportCheckBox.isChecked(),
-                     "num_workers": self.workersSpinBox.value()}}
+                     "num_workers": self.workersSpinBox.value(),
+                     "max_cache_size_mb": self.cacheSizeSpinBox.value(),
+                     "image_memory_mb": self.imageMemorySpinBox.value(),
+                     "scaled_cache_mb": self.scaledCacheSpinBox.value(),
+                     "tracing": self.tracingCheckBox.isChecked()}}
 
         super().accept()
 
@@ -413,6 +483,131 @@ class AdvancedSettingsDialog(QDialog):
         super().reject()
 
 
+class LibraryDialog(QDialog):
+    """The reading history, last read or recently updated series first, or searched by title."""
+    max_entries = 200
+
+    def __init__(self, parent=None, library=None):
+        super().__init__(parent, Qt.WindowCloseButtonHint | Qt.WindowTitleHint)
+        self.library = library
+        self.entries = []
+        self.selected_entry = None
+        self.setWindowTitle("Library")
+        self.resize(480, 420)
+
+        self.mainLayout = QVBoxLayout(self)
+        self.searchLayout = QHBoxLayout()
+        self.searchLineEdit = QLineEdit(self)
+        self.searchLineEdit.setPlaceholderText("Search the library")
+        self.orderComboBox = QComboBox(self)
+        self.orderComboBox.addItems(["Continue Reading", "Recently Updated"])
+        self.searchLayout.addWidget(self.searchLineEdit)
+        self.searchLayout.addWidget(self.orderComboBox)
+        self.mainLayout.addLayout(self.searchLayout)
+        self.entryList = QSmoothScrollingList(self)
+        self.entryList.verticalScrollBar().setSingleStep(1)
+        self.entryList.itemActivated.connect(self.selected_item)
+        self.mainLayout.addWidget(self.entryList)
+
+        self.search_timer = QTimer(self)  # Typing only searches once it pauses
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.refresh)
+        self.searchLineEdit.textChanged.connect(self.search_timer.start)
+        self.orderComboBox.currentIndexChanged.connect(self.refresh)
+        self.refresh()
+
+    def refresh(self):
+        text = self.searchLineEdit.text().strip()
+        if text:
+            self.entries = self.library.search(text, self.max_entries)
+        elif self.orderComboBox.currentIndex() == 1:
+            self.entries = self.library.recently_updated(self.max_entries)
+        else:
+            self.entries = self.library.continue_reading(self.max_entries)
+        self.entryList.clear()
+        for entry in self.entries:
+            text = ' '.join(word[0].upper() + word[1:] if word else '' for word in entry["title"].split())
+            if entry["last_chapter"] is not None:
+                text += f" - Chapter {entry['last_chapter']}"
+                if entry["latest_chapter"] is not None:
+                    text += f" of {entry['latest_chapter']}"
+            if entry["provider"]:
+                text += f" ({entry['provider']})"
+            self.entryList.addItem(text)
+
+    def selected_item(self, item):
+        self.selected_entry = self.entries[self.entryList.row(item)]
+        self.accept()
+
+
+class TraceStatsDialog(QDialog):
+    """Shows the span stats and counters of the tracer, the trace can be exported for chrome://tracing."""
+    def __init__(self, parent=None, chapter_cache=None):
+        super().__init__(parent, Qt.WindowCloseButtonHint | Qt.WindowTitleHint)
+        self.tracer = Tracer.get_instance()
+        self.chapter_cache = chapter_cache
+        self.setWindowTitle("Performance Stats")
+        self.resize(560, 400)
+
+        self.mainLayout = QVBoxLayout(self)
+        self.infoLabel = QLabel(self)
+        self.mainLayout.addWidget(self.infoLabel)
+        self.table = QTableWidget(0, 5, self)
+        self.table.setHorizontalHeaderLabels(["Name", "Count", "Total (ms)", "Mean (ms)", "Max (ms)"])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.mainLayout.addWidget(self.table)
+
+        self.buttonsLayout = QHBoxLayout()
+        self.refreshButton = QPushButton("Refresh", self)
+        self.resetButton = QPushButton("Reset", self)
+        self.exportButton = QPushButton("Export Trace", self)
+        self.closeButton = QPushButton("Close", self)
+        self.refreshButton.clicked.connect(self.refresh)
+        self.resetButton.clicked.connect(self.reset)
+        self.exportButton.clicked.connect(self.export)
+        self.closeButton.clicked.connect(self.accept)
+        for button in (self.refreshButton, self.resetButton, self.exportButton):
+            self.buttonsLayout.addWidget(button)
+        self.buttonsLayout.addStretch()
+        self.buttonsLayout.addWidget(self.closeButton)
+        self.mainLayout.addLayout(self.buttonsLayout)
+
+        self.refresh()
+
+    def refresh(self):
+        info = ("Recording" if self.tracer.enabled
+                else "Not recording, enable Record Performance Traces to collect stats")
+        if self.chapter_cache is not None:
+            info += (f"\nChapter cache: {self.chapter_cache.get_size() / 1024 ** 2:.1f} of "
+                     f"{self.chapter_cache.max_size / 1024 ** 2:.0f} MB used")
+        self.infoLabel.setText(info)
+        stats = self.tracer.get_stats()
+        counters = self.tracer.get_counters()
+        self.table.setRowCount(len(stats) + len(counters))
+        for row, entry in enumerate(stats):
+            values = (entry["name"], str(entry["count"]), f"{entry['total'] * 1000:.1f}",
+                      f"{entry['mean'] * 1000:.2f}", f"{entry['max'] * 1000:.1f}")
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        for row, (name, value) in enumerate(sorted(counters.items()), start=len(stats)):
+            self.table.setItem(row, 0, QTableWidgetItem(name))
+            self.table.setItem(row, 1, QTableWidgetItem(str(value)))
+            for column in range(2, 5):
+                self.table.setItem(row, column, QTableWidgetItem(""))
+
+    def reset(self):
+        self.tracer.reset()
+        self.refresh()
+
+    def export(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Trace", "trace.json", "Json Files (*.json)")
+        if file_path:
+            self.tracer.export(file_path)
+
+
 class CustomLabel(QLabel):
     def paintEvent(self, event):
         painter = QPainter(self)
@@ -494,7 +689,7 @@ class TaskRunner(QThread):
                 self.result = self.func(*self.args, **self.kwargs, progress_queue=self.progress_queue)
             else:
                 return self.func(*self.args, **self.kwargs)
-            self.success = True
+            self.success = self.result is not False
         except SystemExit:
             self.success = False
             self.result = None
@@ -528,7 +723,7 @@ class CustomProgressDialog(QProgressDialog):
     def __init__(self, parent, window_title, window_icon, window_label="Doing a task...", button_text="Cancel",
                  new_thread=True, func=lambda: None, *args, **kwargs):
         super().__init__(parent=parent, cancelButtonText=button_text, minimum=0, maximum=100)
-        self.ttimer = TimidTimer()
+        self.task_span = Tracer.get_instance().span("progress task", title=window_title).start()
         self.setWindowTitle(window_title)
         # self.setValue(0)
         # self.setWindowIcon(QIcon(window_icon))
@@ -555,21 +750,21 @@ class CustomProgressDialog(QProgressDialog):
 
         self.last_value = 0
         self.current_value = 0
+        self.next_fake_step = 0
         QTimer.singleShot(50, self.taskRunner.start)
 
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.updateProgress)
         self.timer.start(100)
-        print(self.ttimer.tick(), "INIT DONE")
 
     def updateProgress(self):
         if self.value() <= 100 and not self.wasCanceled() and self.taskRunner.isRunning():
             if self.current_value == 0 and self.value() < 10:
-                self.setValue(self.value() + 1)
-                time.sleep(random.randint(2, 10) * 0.1)
+                if time.time() >= self.next_fake_step:  # Don't block the event loop, pages may be streaming in
+                    self.setValue(self.value() + 1)
+                    self.next_fake_step = time.time() + random.randint(2, 10) * 0.1
             elif self.current_value >= 10:
                 self.smooth_value()
-            QApplication.processEvents()
 
     def set_value(self, v):
         self.current_value = v
@@ -581,10 +776,9 @@ class CustomProgressDialog(QProgressDialog):
             self.last_value = self.current_value
             return
 
-        for i in range(max(10, self.last_value), self.current_value):
-            self.setValue(i + 1)
-            self.last_value = i + 1
-            time.sleep(0.1)
+        if self.last_value < self.current_value:  # One step per timer tick
+            self.last_value = max(10, self.last_value) + 1
+            self.setValue(self.last_value)
         # print(f"Exiting go_to_value with value {self.current_value} and last_value {self.last_value}") # Debug
 
     def resizeEvent(self, event):
@@ -607,14 +801,14 @@ class CustomProgressDialog(QProgressDialog):
                 self.setValue(100)
                 print("Task completed successfully! Result:" + str(
                     "Finished" if result else "Not finished"))  # Adjust as needed
-                QTimer.singleShot(1000, self.accept)  # Close after 1 second if successful
+                QTimer.singleShot(200, self.accept)  # Close shortly after if successful
             else:
                 palette = QPalette(self.palette())
                 palette.setColor(QPalette.Highlight, QColor(Qt.red))
                 self.setPalette(palette)
                 self.customLabel.setText("Task failed!")
                 self.setCancelButtonText("Close")
-        print("DONE", self.ttimer.end())
+        self.task_span.finish(success=success, canceled=self.wasCanceled())
 
     def cancelTask(self):
         self.taskRunner.stop()
@@ -629,9 +823,381 @@ class CustomProgressDialog(QProgressDialog):
         event.accept()
 
 
-class ImageLabel(QLabel):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+class ImagePage:
+    """
+    A page of the chapter, painted by a PageCanvas. With lazy loading it stays an empty placeholder with the height of
+    the scaled page until it gets loaded, the size of the image is read from the file header so nothing gets decoded
+    for that.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = None
+        self.source_size = QSize()
+        self.placeholder_height = 0
+        self.load_ticket = 0  # Identifies the latest load, older results get dropped
+        self.loading_width = None
+        self.page_index = -1
+        self._pixmap = QPixmap()
+        if path is not None:
+            self.set_path(path)
+
+    def set_path(self, path: str):
+        if path != self.path:
+            self.path = path
+            self.source_size = QImageReader(path).size()
+
+    def pixmap(self) -> QPixmap:
+        return self._pixmap
+
+    def scaled_height(self, width: int) -> int:
+        if not self.source_size.isValid() or self.source_size.width() == 0:
+            return 0
+        return round(self.source_size.height() * width / self.source_size.width())
+
+    def set_placeholder(self, path: str, width: int):
+        self.set_path(path)
+        self.load_ticket += 1  # Pending loads aren't needed anymore
+        self.loading_width = None
+        self._pixmap = QPixmap()
+        self.placeholder_height = self.scaled_height(width)
+
+    def is_loaded(self) -> bool:
+        return not self._pixmap.isNull()
+
+    def is_loading(self) -> bool:
+        return self.loading_width is not None
+
+    def load(self, width: int, loader: Optional["ImageLoader"] = None):
+        """Shows the page scaled to width, it gets decoded in the background if a loader is given."""
+        if loader is None:
+            tracer = Tracer.get_instance()
+            with tracer.span("decode image", page=self.page_index):
+                pixmap = QPixmap(self.path)
+            if not pixmap.isNull() and pixmap.width() != width:
+                with tracer.span("scale image", page=self.page_index, width=width):
+                    pixmap = pixmap.scaledToWidth(width, Qt.TransformationMode.SmoothTransformation)
+            self._pixmap = pixmap
+            return
+        if self.loading_width == width:
+            return
+        self.load_ticket += 1
+        self.loading_width = width
+        loader.load(self, self.load_ticket, self.path, width)
+
+    def finish_load(self, ticket: int, pixmap: QPixmap) -> bool:
+        if ticket != self.load_ticket:
+            return False
+        self.loading_width = None
+        self._pixmap = pixmap
+        return True
+
+    def get_memory_usage(self) -> int:
+        return 0 if self._pixmap.isNull() else self._pixmap.width() * self._pixmap.height() * self._pixmap.depth() // 8
+
+    def get_content_height(self) -> int:
+        return self._pixmap.height() if self.is_loaded() else self.placeholder_height
+
+
+class PageHeights:
+    """
+    Fenwick tree over the page heights. A changed page costs O(log n), the total height is kept up to date in O(1)
+    and page positions or the page at a scroll position are found in O(log n).
+    """
+    def __init__(self, heights=()):
+        self.heights = []
+        self.tree = [0]
+        self.total = 0
+        self.reset(heights)
+
+    def reset(self, heights):
+        self.heights = list(heights)
+        self.tree = [0] * (len(self.heights) + 1)
+        for i, height in enumerate(self.heights, start=1):
+            self.tree[i] += height
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+        self.total = sum(self.heights)
+
+    def __len__(self):
+        return len(self.heights)
+
+    def set(self, index: int, height: int) -> bool:
+        delta = height - self.heights[index]
+        if delta == 0:
+            return False
+        self.heights[index] = height
+        self.total += delta
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+        return True
+
+    def prefix(self, index: int) -> int:
+        """Sum of the heights before page index, so its top position."""
+        result = 0
+        while index > 0:
+            result += self.tree[index]
+            index -= index & -index
+        return result
+
+    def find(self, y: int) -> int:
+        """Index of the page at position y."""
+        index = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            if index + step < len(self.tree) and self.tree[index + step] <= y:
+                index += step
+                y -= self.tree[index]
+            step >>= 1
+        return min(index, max(0, len(self.heights) - 1))
+
+
+class PageCanvas(QWidget):
+    """
+    Paints the pages of a chapter as one widget. Only the page slices inside the exposed rect get drawn, the first one
+    is found through the page heights, so a frame costs the same no matter how long the chapter is.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pages = []
+        self.page_heights = PageHeights()
+        self.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Fixed)
+
+    def set_pages(self, pages: list, page_heights: PageHeights):
+        """Both are shared with the owner, so changes to them only need a sync_height or update afterwards."""
+        self.pages = pages
+        self.page_heights = page_heights
+        self.sync_height()
+
+    def sync_height(self):
+        if self.height() != self.page_heights.total:
+            self.setFixedHeight(self.page_heights.total)
+        self.update()
+
+    def sizeHint(self):
+        return QSize(super().sizeHint().width(), self.page_heights.total)
+
+    def paintEvent(self, event):
+        if not self.pages:
+            return
+        rect = event.rect()
+        painter = QPainter(self)
+        index = self.page_heights.find(max(0, rect.top()))
+        top = self.page_heights.prefix(index)
+        while index < len(self.pages) and top <= rect.bottom():
+            pixmap = self.pages[index].pixmap()
+            if not pixmap.isNull():
+                # Whole pixels only, fractional offsets make the page edges flicker while scrolling
+                x = (self.width() - pixmap.width()) // 2
+                target = QRect(x, top, pixmap.width(), pixmap.height()).intersected(rect)
+                if not target.isEmpty():
+                    painter.drawPixmap(target, pixmap, target.translated(-x, -top))
+            top += self.page_heights.heights[index]
+            index += 1
+        painter.end()
+
+
+class ScaledImageCache:
+    """
+    LRU cache of scaled pages keyed by (content hash, width), so going back to a width (resizing, toggling the side
+    menu, reloading) doesn't decode and rescale the page again. The pixmaps share their data with the pages showing
+    them, so the cache only costs memory for pages that aren't shown anymore.
+    """
+    def __init__(self, max_size: int = 128 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.hashes = {}  # File identity -> content hash, hardlinked copies share it
+
+    @staticmethod
+    def get_identity(path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def set_hash(self, path: str, content_hash: str):
+        identity = self.get_identity(path)
+        if identity is not None:
+            if len(self.hashes) > 10000:
+                self.hashes.clear()
+            self.hashes[identity] = content_hash
+
+    def get(self, path: str, width: int) -> Optional[QPixmap]:
+        content_hash = self.hashes.get(self.get_identity(path))
+        if content_hash is None or (content_hash, width) not in self.entries:
+            return None
+        self.entries.move_to_end((content_hash, width))
+        return self.entries[(content_hash, width)]
+
+    @staticmethod
+    def get_pixmap_size(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+    def put(self, content_hash: str, width: int, pixmap: QPixmap):
+        key = (content_hash, width)
+        if key in self.entries:
+            self.size -= self.get_pixmap_size(self.entries.pop(key))
+        self.entries[key] = pixmap
+        self.size += self.get_pixmap_size(pixmap)
+        self.evict()
+
+    def set_max_size(self, max_size: int):
+        self.max_size = max_size
+        self.evict()
+
+    def evict(self):
+        while self.size > self.max_size and self.entries:
+            _, pixmap = self.entries.popitem(last=False)
+            self.size -= self.get_pixmap_size(pixmap)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+class ProviderIconCache:
+    """
+    Pre-cropped and pre-scaled provider logos saved in folder, named after the hash of the logo file. The combobox icon
+    is rendered at icon_size and the side menu logo at widths rounded down to logo_step, so reloads and resizes only
+    read small files instead of decoding and scaling the full logos again. A changed logo gets a new hash.
+    """
+    icon_size = 64
+    logo_step = 32
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.hashes = {}  # Logo path -> (file stamp, content hash)
+        self.pixmaps = {}  # File name in folder -> QPixmap
+
+    def get_hash(self, logo_path: str) -> Optional[str]:
+        path = os.path.abspath(logo_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self.hashes.get(path)
+        if cached is None or cached[0] != stamp:
+            with open(path, "rb") as f:
+                cached = self.hashes[path] = (stamp, hashlib.sha1(f.read()).hexdigest())
+        return cached[1]
+
+    @staticmethod
+    def crop_logo(image: QImage, clipping_space) -> QImage:
+        if clipping_space is not None:
+            start_x, start_y, end_x, end_y = clipping_space
+            return image.copy(start_y if start_y != "max" else image.width(),
+                              start_x if start_x != "max" else image.height(),
+                              end_y if end_y != "max" else image.width(),
+                              end_x if end_x != "max" else image.height())
+        return image.copy(0, 0, image.height(), image.height())  # Cube cropping
+
+    def _get_rendered(self, name: str, logo_path: str, render) -> QPixmap:
+        if name in self.pixmaps:
+            return self.pixmaps[name]
+        path = os.path.join(self.folder, name)
+        pixmap = QPixmap(path) if os.path.isfile(path) else QPixmap()
+        if pixmap.isNull():
+            print(f"Rendering {name} from {logo_path}")
+            image = render(QImage(os.path.abspath(logo_path)))
+            if not image.isNull() and not image.save(path, "PNG"):
+                print(f"Could not save {path}")
+            pixmap = QPixmap.fromImage(image)
+        self.pixmaps[name] = pixmap
+        return pixmap
+
+    def get_icon(self, logo_path: str, clipping_space=None) -> QIcon:
+        content_hash = self.get_hash(logo_path)
+        if content_hash is None:
+            return QIcon()
+        clipping = "-".join(str(value) for value in clipping_space) if clipping_space is not None else "cube"
+        name = f"{content_hash}-{clipping}-{self.icon_size}.png"
+        return QIcon(self._get_rendered(
+            name, logo_path, lambda image: self.crop_logo(image, clipping_space).scaled(
+                self.icon_size, self.icon_size, Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation)))
+
+    def get_logo(self, logo_path: str, max_width: int) -> QPixmap:
+        """The logo scaled to the largest step width that fits into max_width."""
+        content_hash = self.get_hash(logo_path)
+        if content_hash is None:
+            return QPixmap()
+        width = max(self.logo_step, max_width // self.logo_step * self.logo_step)
+        return self._get_rendered(f"{content_hash}-w{width}.png", logo_path,
+                                  lambda image: image.scaledToWidth(width, Qt.TransformationMode.SmoothTransformation))
+
+
+class ImageLoadTask(QRunnable):
+    def __init__(self, loader: "ImageLoader", page: ImagePage, ticket: int, path: str, width: int):
+        super().__init__()
+        self.loader = loader
+        self.page = page
+        self.ticket = ticket
+        self.path = path
+        self.width = width
+
+    def run(self):
+        tracer = Tracer.get_instance()
+        if self.page.load_ticket != self.ticket:  # Got outdated while waiting in the queue
+            tracer.count("outdated image loads")
+            return
+        try:
+            with tracer.span("read image", page=self.page.page_index):
+                with open(self.path, "rb") as f:
+                    data = f.read()
+        except OSError as e:
+            print(f"Could not read {self.path}: {e}")
+            data = b""
+        content_hash = hashlib.sha1(data).hexdigest()
+        with tracer.span("decode image", page=self.page.page_index, bytes=len(data)):
+            image = QImage.fromData(data)
+        if not image.isNull() and image.width() != self.width:
+            with tracer.span("scale image", page=self.page.page_index, width=self.width):
+                image = image.scaledToWidth(self.width, Qt.TransformationMode.SmoothTransformation)
+        self.loader.image_loaded.emit(self.page, self.ticket, self.path, self.width, content_hash, image)
+
+
+class ImageLoader(QObject):
+    """
+    Decodes and scales pages on a QThreadPool. The finished QImage is handed back to the GUI thread, where turning it
+    into a QPixmap is cheap. Scaled pages are kept in a ScaledImageCache.
+    """
+    image_loaded = Signal(object, int, str, int, str, QImage)
+    page_loaded = Signal(object)
+
+    def __init__(self, parent=None, max_cache_size: int = 128 * 1024 * 1024):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.cache = ScaledImageCache(max_cache_size)
+        self.image_loaded.connect(self._deliver)
+
+    def load(self, page: ImagePage, ticket: int, path: str, width: int):
+        pixmap = self.cache.get(path, width)
+        if pixmap is not None:
+            Tracer.get_instance().count("scaled cache hits")
+            page.finish_load(ticket, pixmap)
+            self.page_loaded.emit(page)
+            return
+        self.pool.start(ImageLoadTask(self, page, ticket, path, width))
+
+    @Slot(object, int, str, int, str, QImage)
+    def _deliver(self, page, ticket, path, width, content_hash, image):
+        with Tracer.get_instance().span("upload pixmap", page=page.page_index):
+            pixmap = QPixmap.fromImage(image)
+        if not pixmap.isNull():
+            self.cache.set_hash(path, content_hash)
+            self.cache.put(content_hash, width, pixmap)
+        if page.finish_load(ticket, pixmap):
+            self.page_loaded.emit(page)
+
+    def close(self):
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.cache.clear()
 
 
 class SearchResultItem(QWidget):
@@ -656,16 +1222,95 @@ class SearchResultItem(QWidget):
         self.layout.addLayout(self.text_layout)
 
 
+class SearchTask(QRunnable):
+    def __init__(self, widget: "SearchWidget", ticket: int, source: str, func, text: str,
+                 timeout: Optional[float] = None):
+        super().__init__()
+        self.widget = widget
+        self.ticket = ticket
+        self.source = source
+        self.func = func
+        self.text = text
+        self.deadline = time.time() + timeout if timeout is not None else None
+
+    def search(self) -> Optional[list]:
+        """Runs on the widget's executor, the requests of the provider can't take longer than the time that is left."""
+        if self.widget.ticket != self.ticket:  # The user kept typing before the request was sent
+            return None
+        if self.deadline is None:
+            return list(self.func(self.text) or ())
+        with HttpClient.get_instance().request_timeout(max(self.deadline - time.time(), 0.1)):
+            return list(self.func(self.text) or ())
+
+    def run(self):
+        if self.widget.ticket != self.ticket:  # Got outdated while waiting in the queue
+            return
+        # A dead site only keeps an executor thread busy, this one stops waiting at the deadline
+        future = self.widget.executor.submit(self.search)
+        try:
+            results = future.result(None if self.deadline is None else max(self.deadline - time.time(), 0.0))
+        except FutureTimeoutError:
+            print(f"Search of {self.source} for '{self.text}' timed out")
+            return
+        except Exception as e:
+            print(f"Search of {self.source} for '{self.text}' failed: {e}")
+            return
+        if results is None or self.widget.ticket != self.ticket:  # Nobody wants these anymore
+            return
+        for result_text, icon_path in results:
+            self.widget.result_found.emit(self.ticket, self.source, result_text, icon_path)
+        self.widget.search_finished.emit(self.source, self.text, results)
+
+
 class SearchWidget(QWidget):
+    """
+    Searches while typing. The search only starts once the user stopped typing for debounce_ms, runs on a
+    QThreadPool and results are shown as they come in. A newer query makes older ones stale, their results get dropped.
+    The results of the last queries are kept per provider.
+    In federated mode the query goes to all sources at once, each gets source_timeout seconds. Their results are merged
+    and labelled with the icon of the source, titles found by more than one source are only shown once.
+    """
     selectedItem = Signal(str)
-
-    def __init__(self, search_results_func):
+    sourceSelected = Signal(str)  # Emitted before selectedItem if the result is from another source
+    result_found = Signal(int, str, str, str)
+    search_finished = Signal(str, str, list)
+    debounce_ms = 300
+    max_cached_queries = 32
+    source_timeout = 8
+
+    def __init__(self, search_results_func, source: str = ""):
         super().__init__()
         self.initUI()
         self.search_results_func = search_results_func
-
-    def set_search_results_func(self, new_func):
+        self.source = source
+        self.sources = {}  # Source -> (search results func, icon), used in federated mode
+        self.ticket = 0
+        self.result_cache = {}  # Source -> OrderedDict of query -> [(result text, icon path), ...]
+        self.result_items = {}  # Normalized result text -> item of the current query
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(4)
+        self.executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="Search")  # The actual requests
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(self.debounce_ms)
+        self.debounce_timer.timeout.connect(self.start_search)
+        self.result_found.connect(self.add_result)
+        self.search_finished.connect(self.cache_results)
+
+    def set_search_results_func(self, new_func, source: str = ""):
         self.search_results_func = new_func
+        self.source = source
+        self.ticket += 1
+
+    def set_sources(self, sources: dict):
+        """Sets the sources of the federated mode, {source: (search results func, QIcon)}."""
+        self.sources = sources
+        self.pool.setMaxThreadCount(max(4, len(sources)))  # A slow source shouldn't keep the others waiting
+        self.federated_button.setVisible(bool(sources))
+        self.ticket += 1
+
+    def is_federated(self) -> bool:
+        return self.federated_button.isChecked() and bool(self.sources)
 
     def sizeHint(self):
         search_bar_size_hint = self.search_bar.sizeHint()
@@ -688,36 +1333,109 @@ class SearchWidget(QWidget):
         self.search_bar.textChanged.connect(self.on_text_changed)
         self.search_bar.returnPressed.connect(self.on_return_pressed)
 
+        self.federated_button = QToolButton(self)
+        self.federated_button.setText("All")
+        self.federated_button.setToolTip("Search all providers")
+        self.federated_button.setCheckable(True)
+        self.federated_button.hide()
+        self.federated_button.toggled.connect(lambda: self.on_text_changed(self.search_bar.text()))
+
+        search_bar_layout = QHBoxLayout()
+        search_bar_layout.addWidget(self.search_bar)
+        search_bar_layout.addWidget(self.federated_button)
+        search_bar_layout.setContentsMargins(0, 0, 0, 0)
+        search_bar_layout.setSpacing(0)
+
         self.results_list = QListWidget(self)
         self.results_list.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Ignored)
         self.results_list.hide()
         self.results_list.itemActivated.connect(self.on_item_activated)
 
         layout = QVBoxLayout(self)
-        layout.addWidget(self.search_bar)
+        layout.addLayout(search_bar_layout)
         layout.addWidget(self.results_list)
         layout.setContentsMargins(0, 0, 0, 0)  # Set margins to zero
         layout.setSpacing(0)  # Set spacing to zero
 
     def on_text_changed(self, text):
+        self.ticket += 1  # Everything still running is stale now
         self.results_list.clear()
-        if text and self.search_bar.hasFocus():
-            # Assume get_search_results is a function that returns a list of tuples with the result text and icon path.
-            results = self.search_results_func(text)
-            for result_text, icon_path in results:
-                item = QListWidgetItem(result_text)
-                item.setIcon(QIcon(env.absolute_path(icon_path)))
-                self.results_list.addItem(item)
-            self.results_list.show()
+        self.result_items.clear()
+        self.results_list.hide()
+        if text.strip() and (self.search_bar.hasFocus() or self.federated_button.hasFocus()):
+            self.debounce_timer.start()
         else:
-            self.results_list.hide()
+            self.debounce_timer.stop()
+        self.update_size()
 
+    def start_search(self):
+        text = self.search_bar.text().strip()
+        if not text:
+            return
+        self.ticket += 1
+        self.pool.clear()  # Queries that didn't start yet are outdated
+        if self.is_federated():
+            for source, (func, _) in self.sources.items():
+                self.search_source(source, func, text, self.source_timeout)
+        else:
+            self.search_source(self.source, self.search_results_func, text)
+
+    def search_source(self, source: str, func, text: str, timeout: Optional[float] = None):
+        cached = self.result_cache.get(source, {}).get(text.lower())
+        if cached is not None:
+            self.result_cache[source].move_to_end(text.lower())
+            for result_text, icon_path in cached:
+                self.add_result(self.ticket, source, result_text, icon_path)
+            return
+        self.pool.start(SearchTask(self, self.ticket, source, func, text, timeout))
+
+    @Slot(int, str, str, str)
+    def add_result(self, ticket, source, result_text, icon_path):
+        if ticket != self.ticket:
+            return
+        key = " ".join(result_text.lower().split())
+        if key in self.result_items:  # Already found by another source
+            item = self.result_items[key]
+            if source not in item.toolTip().split(", "):
+                item.setToolTip(f"{item.toolTip()}, {source}")
+            return
+        item = QListWidgetItem(result_text)
+        if self.is_federated() and source in self.sources:
+            item.setIcon(self.sources[source][1])
+        else:
+            item.setIcon(QIcon(env.absolute_path(icon_path)))
+        item.setData(Qt.ItemDataRole.UserRole, source)
+        item.setToolTip(source)
+        self.result_items[key] = item
+        self.results_list.addItem(item)
+        if not self.results_list.isVisible():
+            self.results_list.show()
+        self.update_size()
+
+    @Slot(str, str, list)
+    def cache_results(self, source, text, results):
+        queries = self.result_cache.setdefault(source, OrderedDict())
+        queries[text.lower()] = results
+        queries.move_to_end(text.lower())
+        while len(queries) > self.max_cached_queries:
+            queries.popitem(last=False)
+
+    def update_size(self):
         self.adjustSize()
         self.updateGeometry()  # Notify the layout system of potential size change
         self.results_list.updateGeometry()  # Notify the layout system of potential size change
         # self.window().adjustSize()  # Adjust the size of the parent window
 
+    def stop(self):
+        self.ticket += 1
+        self.debounce_timer.stop()
+        self.pool.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
     def on_return_pressed(self):
+        if self.debounce_timer.isActive():  # Don't wait for the user to stop typing
+            self.debounce_timer.stop()
+            self.start_search()
         item = self.results_list.currentItem() or self.results_list.item(0)
         if item:
             self.select_item(item)
@@ -727,9 +1445,12 @@ class SearchWidget(QWidget):
 
     def select_item(self, item):
         title = item.text()
+        source = item.data(Qt.ItemDataRole.UserRole)
         print(f'Selected: {title}')
         self.search_bar.setText('')
         self.results_list.hide()
+        if source != self.source:
+            self.sourceSelected.emit(source)
         self.selectedItem.emit(title)
 
 
@@ -800,6 +1521,8 @@ class DummyViewport(QWidget):
 
 
 class CustomScrollArea(QWidget):
+    resized = Signal()
+
     def __init__(self, parent=None):
         super().__init__(parent=parent)
         self.layout = QNoSpacingVBoxLayout()
@@ -962,9 +1685,18 @@ class CustomScrollArea(QWidget):
         #        widget.resize(widget.pixmap().width(), widget.pixmap().height())
 
         self.reload_scrollbars()
+        self.resized.emit()
 
         event.accept()
 
+    def event(self, event):
+        result = super().event(event)
+        if event.type() == QEvent.Type.LayoutRequest and hasattr(self, "recorded_default_size"):
+            # The layout fits the content widget into the viewport again, but its size and position are managed by us
+            self.content_widget.resize(self.content_widget.width(), self.recorded_default_size.height())
+            self.updateContentPosition(0)
+        return result
+
     def wheelEvent(self, event):
         # Scroll with the mouse wheel
         delta = event.angleDelta().y()
@@ -1053,9 +1785,30 @@ class QAdvancedSmoothScrollingArea(CustomScrollArea):
 
 
 class Settings:
-    def __init__(self, db_path, overwrite_settings: Optional[dict] = None, export_settings_func=lambda: None):
+    """
+    The settings in data.db. Values are parsed once and cached until they change, get hands out copies of lists and
+    dicts while get_cached, get_misc and get_theme don't copy. Changed keys are only marked dirty, they get written
+    together in one transaction flush_delay ms after the last change, on flush or on close.
+    """
+    flush_delay = 500
+    migrations = [
+        # 1: Older versions created settings without a primary key and could store a key twice, the last row wins
+        ["CREATE TABLE IF NOT EXISTS settings (key TEXT, value TEXT)",
+         "CREATE TABLE settings_new (key TEXT PRIMARY KEY NOT NULL, value TEXT)",
+         "INSERT INTO settings_new (key, value) SELECT key, value FROM settings "
+         "WHERE rowid IN (SELECT MAX(rowid) FROM settings WHERE key IS NOT NULL GROUP BY key)",
+         "DROP TABLE settings",
+         "ALTER TABLE settings_new RENAME TO settings"],
+    ]
+
+    def __init__(self, db_path, overwrite_settings: Optional[dict] = None, export_settings_func=lambda keys: None):
+        is_new = not os.path.isfile(db_path)  # Connecting creates the file
         self.db = DBManager(db_path)
         self.is_open = True
+        self.dirty = set()
+        self.flush_timer = None
+        self.values = {}  # Key -> parsed value
+        self.subscribers = {}  # Key -> [callback, ...]
         self.default_settings = {
             "provider": "ManhwaClan",
             "title": "Thanks for using ManhwaViewer!",
@@ -1072,7 +1825,7 @@ class Settings:
             "stay_on_top": "False",
             "geometry": "100, 100, 640, 480",
             "blacklisted_websites": "247manga.com, ww6.mangakakalot.tv, jimanga.com, mangapure.net, mangareader.mobi, onepiece.fandom.com, mangaowl.io",
-            "advanced_settings": '{"recent_titles": [], "themes": {"light": "light_light", "dark": "dark", "font": "Segoe UI"}, "settings_file_path": "", "settings_file_mode": "overwrite", "misc": {"auto_export": false, "num_workers": 10}}',
+            "advanced_settings": '{"recent_titles": [], "themes": {"light": "light_light", "dark": "dark", "font": "Segoe UI"}, "settings_file_path": "", "settings_file_mode": "overwrite", "misc": {"auto_export": false, "num_workers": 10, "max_cache_size_mb": 500, "image_memory_mb": 256, "scaled_cache_mb": 128, "tracing": false}}',
             "provider_type": "direct",
             "chapter_rate": "0.5",
             "no_update_info": "True",
@@ -1085,10 +1838,13 @@ class Settings:
         self.settings = self.default_settings.copy()
         if overwrite_settings:
             self.settings.update(overwrite_settings)
-        if not os.path.isfile(db_path):
-            self.setup_database(self.settings)
-        self.fetch_data()
         self.export_settings_func = export_settings_func
+        if is_new:
+            self.setup_database(self.settings)
+        else:
+            self.db.migrate(self.migrations)
+        stored_keys = self.fetch_data()
+        self.dirty.update(key for key in self.settings if key not in stored_keys)  # New settings get written too
 
     def connect(self):
         self.db.connect()
@@ -1107,8 +1863,7 @@ class Settings:
     def list_to_str(self, lst: List[str]) -> str:
         return ', '.join(lst)
 
-    def get(self, key: str):
-        value = self.settings.get(key)
+    def parse(self, key: str, value: str):
         if key in ["blacklisted_websites"]:
             return self.str_to_list(value)
         elif key in ["chapter"]:
@@ -1127,7 +1882,7 @@ class Settings:
             return json.loads(value)
         return value
 
-    def set(self, key: str, value):
+    def serialize(self, key: str, value) -> str:
         if key in ["blacklisted_websites"]:
             value = self.list_to_str(value)
         elif key in ["chapter"]:
@@ -1144,10 +1899,79 @@ class Settings:
             value = ', '.join([str(x) for x in value])
         elif key in ["advanced_settings"]:
             value = json.dumps(value)
+        return value
+
+    @classmethod
+    def _copy(cls, value):
+        if isinstance(value, dict):
+            return {key: cls._copy(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [cls._copy(item) for item in value]
+        return value
+
+    def get_cached(self, key: str):
+        """The parsed value, shared with every other caller, so it must not be changed."""
+        try:
+            return self.values[key]
+        except KeyError:
+            value = self.values[key] = self.parse(key, self.settings.get(key))
+            return value
+
+    def get(self, key: str):
+        value = self.get_cached(key)
+        return self._copy(value) if isinstance(value, (dict, list)) else value
+
+    def get_misc(self, name: str, default=None):
+        return self.get_cached("advanced_settings")["misc"].get(name, default)
+
+    def get_theme(self, name: str):
+        return self.get_cached("advanced_settings")["themes"].get(name)
+
+    def subscribe(self, key: str, callback):
+        """callback gets the new value (shared, don't change it) every time key changes."""
+        self.subscribers.setdefault(key, []).append(callback)
+
+    def unsubscribe(self, key: str, callback):
+        if callback in self.subscribers.get(key, []):
+            self.subscribers[key].remove(callback)
+
+    def notify(self, keys):
+        for key in keys:
+            for callback in list(self.subscribers.get(key, [])):
+                callback(self.get_cached(key))
+
+    def set(self, key: str, value):
+        value = self.serialize(key, value)
+        if self.settings.get(key) == value:
+            return
         self.settings[key] = value
-        self.update_data()
-        if self.get_advanced_settings()["misc"]["auto_export"]:
-            self.export_settings_func()
+        self.values.pop(key, None)
+        self.dirty.add(key)
+        self.schedule_flush()
+        self.notify([key])
+
+    def schedule_flush(self):
+        if QApplication.instance() is None:  # No event loop to wait in
+            self.flush()
+            return
+        if self.flush_timer is None:
+            self.flush_timer = QTimer()
+            self.flush_timer.setSingleShot(True)
+            self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(self.flush_delay)
+
+    def flush(self):
+        """Writes the dirty keys in one transaction and auto-exports if that is enabled."""
+        if self.flush_timer is not None:
+            self.flush_timer.stop()
+        if not self.dirty or not self.is_open:
+            return
+        keys = sorted(self.dirty)
+        if not self.db.upsert_many("settings", [(key, self.settings[key]) for key in keys], ["key", "value"]):
+            return  # Stays dirty, the next flush tries again
+        self.dirty.difference_update(keys)
+        if self.get_misc("auto_export"):
+            self.export_settings_func(keys)
 
     def get_provider(self):
         return self.get("provider")
@@ -1296,55 +2120,181 @@ class Settings:
     def setup_database(self, settings):
         # Define tables and their columns
         tables = {
-            "settings": ["key TEXT", "value TEXT"]
+            "settings": ["key TEXT PRIMARY KEY NOT NULL", "value TEXT"]
         }
         # Code to set up the database, initialize password hashes, etc.
         for table_name, columns in tables.items():
             self.db.create_table(table_name, columns)
-        for i in self.settings.items():
-            self.db.update_info(i, "settings", ["key", "value"])
+        self.db.cursor.execute(f"PRAGMA user_version = {len(self.migrations)}")  # Already the newest schema
+        self.db.upsert_many("settings", list(settings.items()), ["key", "value"])
 
-    def fetch_data(self):
+    def fetch_data(self) -> set:
+        """Loads the stored settings, notifies about the ones that changed and returns their keys."""
         fetched_data = self.db.get_info("settings", ["key", "value"])
+        changed = []
         for item in fetched_data:
             key, value = item
-            self.settings[key] = value
-
-    def update_data(self):
-        for key, value in self.settings.items():
-            self.db.update_info((key, value), "settings", ["key", "value"])
+            if key not in self.dirty and self.settings.get(key) != value:  # Dirty ones aren't written yet
+                self.settings[key] = value
+                self.values.pop(key, None)
+                changed.append(key)
+        self.notify(changed)
+        return {key for key, _ in fetched_data}
+
+    def checkpoint(self):
+        """Call before copying data.db, with WAL journaling the last changes may still be in data.db-wal."""
+        if self.is_open:
+            self.db.checkpoint()
+
+    def import_database(self, path: str) -> bool:
+        """
+        Replaces everything in data.db with the database at path. It goes through sqlite's backup API, so the open
+        connection stays valid and a crash in between can't leave a half copied file.
+        """
+        self.flush()
+        try:
+            source = sqlite3.connect(path)
+            try:
+                source.backup(self.db.conn)
+            finally:
+                source.close()
+        except sqlite3.Error as e:
+            print(f"Error importing {path}: {e}")
+            return False
+        self.db.migrate(self.migrations)
+        stored_keys = self.fetch_data()
+        self.dirty.update(key for key in self.settings if key not in stored_keys)
+        self.schedule_flush()
+        return True
+
+    def import_json(self, path: str) -> bool:
+        """Takes over the settings from an exported json file, the other settings keep their values."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rows = [(row["key"], row["value"]) for row in json.load(f).get("settings", [])]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error importing {path}: {e}")
+            return False
+        self.flush()
+        if not self.db.upsert_many("settings", rows, ["key", "value"]):
+            return False
+        self.fetch_data()
+        return True
 
     def close(self):
+        self.flush()
         self.is_open = False
         self.db.close()
 
 
 class AutoProviderManager:
-    def __init__(self, path, prov_plug, prov_sub_plugs: list):
+    """
+    Finds the providers in the extension folder. What the menu needs to know about them (module, logo, clipping space,
+    capabilities) is kept in a manifest at manifest_path together with the mtime of their file, so an extension module
+    only gets imported if it changed or one of its providers is actually used.
+    """
+    def __init__(self, path, prov_plug, prov_sub_plugs: list, manifest_path: Optional[str] = None,
+                 probe_args: tuple = ()):
         self.path = path
         self.prov_plug = prov_plug
         self.prov_sub_plugs = prov_sub_plugs
+        self.manifest_path = manifest_path
+        self.probe_args = probe_args  # Arguments to construct a provider with just to look at it
+        self.lock = threading.RLock()
+        self.modules = {}  # Module name -> imported module
+        self.instances = {}  # Provider name -> provider constructed with probe_args
         self.providers = self._load_providers()
 
+    @staticmethod
+    def _get_file_stamp(path: str) -> list:
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _load_manifest(self) -> dict:
+        if self.manifest_path is None or not os.path.isfile(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load the provider manifest: {e}")
+            return {}
+        # A changed base class can change every provider
+        if manifest.get("base") != self._get_file_stamp(inspect.getfile(self.prov_plug)):
+            return {}
+        return manifest.get("files", {})
+
+    def _save_manifest(self, files: dict):
+        if self.manifest_path is None:
+            return
+        temp_path = f"{self.manifest_path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"base": self._get_file_stamp(inspect.getfile(self.prov_plug)), "files": files}, f)
+            os.replace(temp_path, self.manifest_path)
+        except OSError as e:
+            print(f"Could not save the provider manifest: {e}")
+
+    def _import_module(self, module_name: str):
+        with self.lock:
+            if module_name not in self.modules:
+                file = next(file for file in os.listdir(self.path) if file.split(".")[0] == module_name)
+                spec = importlib.util.spec_from_file_location(module_name, os.path.join(self.path, file))
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self.modules[module_name] = module
+            return self.modules[module_name]
+
+    def _scan_module(self, module_name: str) -> dict:
+        """Imports the module and constructs each of its providers once to fill in their manifest entries."""
+        module = self._import_module(module_name)
+        providers = {}
+        for attribute_name in dir(module):
+            attribute = getattr(module, attribute_name)
+            if (isinstance(attribute, type) and issubclass(attribute, self.prov_plug) and attribute not in
+                    self.prov_sub_plugs):
+                provider = self.get_instance(attribute_name, attribute)
+                providers[attribute_name] = {"module": module_name,
+                                             "logo_path": provider.get_logo_path(),
+                                             "clipping_space": provider.clipping_space,
+                                             "capabilities": {"search": bool(provider.get_search_results(None))}}
+        return providers
+
     def _load_providers(self):
+        manifest = self._load_manifest()
+        files = {}
         providers = {}
         for file in os.listdir(self.path):
             if file.endswith('.py') or file.endswith('.pyd') and file != '__init__.py':
                 module_name = file.split(".")[0]
-                module_path = os.path.join(self.path, file)
-                spec = importlib.util.spec_from_file_location(module_name, module_path)
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-                for attribute_name in dir(module):
-                    attribute = getattr(module, attribute_name)
-                    if (isinstance(attribute, type) and issubclass(attribute, self.prov_plug) and attribute not in
-                            self.prov_sub_plugs):
-                        providers[attribute_name] = attribute
+                stamp = self._get_file_stamp(os.path.join(self.path, file))
+                entry = manifest.get(file)
+                if (entry is None or entry["stamp"] != stamp
+                        or not all(os.path.isfile(os.path.abspath(info["logo_path"]))
+                                   for info in entry["providers"].values())):
+                    print(f"Scanning providers of {file}")
+                    entry = {"stamp": stamp, "providers": self._scan_module(module_name)}
+                files[file] = entry
+                providers.update(entry["providers"])
+        if files != manifest:
+            self._save_manifest(files)
         return providers
 
-    def get_providers(self):
+    def get_providers(self) -> dict:
+        """Provider name -> manifest entry, nothing gets imported for this."""
         return self.providers
 
+    def get_provider_class(self, name: str):
+        return getattr(self._import_module(self.providers[name]["module"]), name)
+
+    def get_instance(self, name: str, provider_cls=None):
+        """A provider constructed with the probe arguments, it is only created the first time it is needed."""
+        with self.lock:
+            if name not in self.instances:
+                provider_cls = provider_cls or self.get_provider_class(name)
+                self.instances[name] = provider_cls(*self.probe_args)
+            return self.instances[name]
+
 
 class UnselectableDelegate(QStyledItemDelegate):
     def editorEvent(self, event, model, option, index):
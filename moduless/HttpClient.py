@@ -0,0 +1,129 @@
+from requests.adapters import HTTPAdapter
+from contextlib import contextmanager
+from typing import Optional
+import threading
+import requests
+import asyncio
+
+
+def _get_accept_encoding() -> str:
+    encodings = ["gzip", "deflate"]
+    try:  # urllib3 can only decode brotli if one of these is installed
+        import brotli
+        encodings.append("br")
+    except ImportError:
+        try:
+            import brotlicffi
+            encodings.append("br")
+        except ImportError:
+            pass
+    return ", ".join(encodings)
+
+
+class HttpClient:
+    """
+    One pooled HTTP client shared by all providers. Connections are kept alive per host, so repeated requests to the
+    same site don't repeat the TCP and TLS handshakes. Blocking calls go through a requests Session, async downloads
+    through a single aiohttp ClientSession that lives on a background event loop. Blocking calls without a timeout
+    get the default one, so a dead site can't hang a thread forever. The async connections to a host are limited by
+    one semaphore per host, shared by every download, so prefetched chapters don't multiply the limit.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, pool_connections: int = 16, pool_maxsize: int = 32, timeout: float = 30):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = _get_accept_encoding()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[threading.Thread] = None
+        self.async_session: Optional["aiohttp.ClientSession"] = None
+        self.host_limits = {}  # Host -> (limit, asyncio.Semaphore), only used on the event loop
+        self.local = threading.local()  # Timeout of the blocking calls of a thread, see request_timeout
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "HttpClient":
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def get_timeout(self) -> float:
+        return getattr(self.local, "timeout", None) or self.timeout
+
+    @contextmanager
+    def request_timeout(self, timeout: float):
+        """Blocking calls of this thread without their own timeout use timeout instead of the default one."""
+        previous = getattr(self.local, "timeout", None)
+        self.local.timeout = timeout
+        try:
+            yield
+        finally:
+            self.local.timeout = previous
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.get_timeout())
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.get_timeout())
+        return self.session.post(url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.get_timeout())
+        return self.session.head(url, **kwargs)
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None or self.loop.is_closed():
+                self.loop = asyncio.new_event_loop()
+                self.loop_thread = threading.Thread(target=self.loop.run_forever, name="HttpClientLoop", daemon=True)
+                self.loop_thread.start()
+            return self.loop
+
+    async def get_async_session(self) -> "aiohttp.ClientSession":
+        """The shared aiohttp session, only use it from coroutines passed to run."""
+        import aiohttp  # Takes a while to import and isn't needed until something gets downloaded
+        if self.async_session is None or self.async_session.closed:
+            connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300, keepalive_timeout=30)
+            self.async_session = aiohttp.ClientSession(connector=connector)
+        return self.async_session
+
+    def get_host_limit(self, host: str, limit: int) -> asyncio.Semaphore:
+        """
+        The semaphore for host, only use it from coroutines passed to run. A new limit replaces the semaphore, the
+        downloads that already hold the old one finish with it.
+        """
+        limit = max(1, limit)
+        entry = self.host_limits.get(host)
+        if entry is None or entry[0] != limit:
+            entry = self.host_limits[host] = (limit, asyncio.Semaphore(limit))
+        return entry[1]
+
+    def run(self, coroutine):
+        """Runs a coroutine on the shared event loop and waits for its result."""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._get_loop())
+        try:
+            return future.result()
+        except BaseException:  # TaskRunner cancels by raising into the waiting thread
+            future.cancel()
+            raise
+
+    def close(self):
+        self.session.close()
+        with self.lock:
+            loop, self.loop = self.loop, None
+        if loop is None:
+            return
+        if self.async_session is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self.async_session.close(), loop).result(timeout=5)
+            except Exception as e:
+                print(f"Error closing the async HTTP session: {e}")
+            self.async_session = None
+        self.host_limits.clear()  # Bound to the stopped loop
+        loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,227 @@
+from typing import Optional
+import sqlite3
+import time
+
+
+class Library:
+    """
+    The reading history in data.db: every series that was read, the chapters read with their last scroll position and
+    the urls of the series per provider. "Continue reading" and "recently updated" are index scans and titles are
+    searched through an FTS5 index (a LIKE scan if sqlite was built without FTS5), so the queries stay fast with
+    thousands of series. It uses the connection of the given DBManager, which may get closed and reopened.
+    """
+    schema = [
+        """CREATE TABLE IF NOT EXISTS library_series (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            provider TEXT,
+            added REAL NOT NULL,
+            last_read REAL,
+            last_chapter REAL,
+            latest_chapter REAL,
+            updated REAL)""",
+        "CREATE INDEX IF NOT EXISTS library_series_last_read ON library_series (last_read)",
+        "CREATE INDEX IF NOT EXISTS library_series_updated ON library_series (updated)",
+        """CREATE TABLE IF NOT EXISTS library_chapters (
+            series_id INTEGER NOT NULL REFERENCES library_series (id) ON DELETE CASCADE,
+            chapter REAL NOT NULL,
+            read_at REAL NOT NULL,
+            scroll_vertical INTEGER,
+            scroll_horizontal INTEGER,
+            PRIMARY KEY (series_id, chapter)) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS library_providers (
+            series_id INTEGER NOT NULL REFERENCES library_series (id) ON DELETE CASCADE,
+            provider TEXT NOT NULL,
+            url TEXT,
+            seen REAL NOT NULL,
+            PRIMARY KEY (series_id, provider)) WITHOUT ROWID""",
+    ]
+    search_schema = [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS library_search USING fts5 (
+            title, content='library_series', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+        """CREATE TRIGGER IF NOT EXISTS library_series_insert AFTER INSERT ON library_series BEGIN
+            INSERT INTO library_search (rowid, title) VALUES (new.id, new.title);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS library_series_delete AFTER DELETE ON library_series BEGIN
+            INSERT INTO library_search (library_search, rowid, title) VALUES ('delete', old.id, old.title);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS library_series_title AFTER UPDATE OF title ON library_series
+        WHEN old.title IS NOT new.title BEGIN
+            INSERT INTO library_search (library_search, rowid, title) VALUES ('delete', old.id, old.title);
+            INSERT INTO library_search (rowid, title) VALUES (new.id, new.title);
+        END""",
+    ]
+    entry_columns = "s.title, s.provider, s.last_chapter, s.last_read, s.latest_chapter, s.updated"
+
+    def __init__(self, db):
+        self.db = db
+        self.has_search_index = False
+        self.setup()
+
+    def setup(self):
+        try:
+            with self.db.conn:
+                for statement in self.schema:
+                    self.db.conn.execute(statement)
+        except sqlite3.Error as e:
+            print(f"Error setting up the library: {e}")
+            return
+        try:
+            with self.db.conn:
+                for statement in self.search_schema:
+                    self.db.conn.execute(statement)
+            self.has_search_index = True
+        except sqlite3.OperationalError as e:  # No FTS5 in this sqlite build
+            print(f"Library search falls back to LIKE: {e}")
+
+    @staticmethod
+    def make_key(title: str) -> str:
+        return ' '.join(title.lower().split())
+
+    @staticmethod
+    def _chapter(chapter):
+        if chapter is None:
+            return None
+        chapter = float(chapter)
+        return int(chapter) if chapter.is_integer() else chapter
+
+    def _entries(self, query: str, parameters: tuple) -> list:
+        try:
+            rows = self.db.conn.execute(query, parameters).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading the library: {e}")
+            return []
+        return [{"title": title, "provider": provider, "last_chapter": self._chapter(last_chapter),
+                 "last_read": last_read, "latest_chapter": self._chapter(latest_chapter), "updated": updated}
+                for title, provider, last_chapter, last_read, latest_chapter, updated in rows]
+
+    def _get_series_id(self, title: str) -> Optional[int]:
+        row = self.db.conn.execute("SELECT id FROM library_series WHERE key = ?", (self.make_key(title),)).fetchone()
+        return row[0] if row is not None else None
+
+    def mark_read(self, title: str, provider: str, chapter, url: Optional[str] = None):
+        """Adds the series if needed and makes chapter its last read one."""
+        now = time.time()
+        try:
+            with self.db.conn:
+                self.db.conn.execute(
+                    "INSERT INTO library_series (key, title, provider, added, last_read, last_chapter) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET title = excluded.title, "
+                    "provider = excluded.provider, last_read = excluded.last_read, last_chapter = excluded.last_chapter",
+                    (self.make_key(title), title, provider, now, now, float(chapter)))
+                series_id = self._get_series_id(title)
+                self.db.conn.execute(
+                    "INSERT INTO library_chapters (series_id, chapter, read_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(series_id, chapter) DO UPDATE SET read_at = excluded.read_at",
+                    (series_id, float(chapter), now))
+                if url:
+                    self.db.conn.execute(
+                        "INSERT INTO library_providers (series_id, provider, url, seen) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(series_id, provider) DO UPDATE SET url = excluded.url, seen = excluded.seen",
+                        (series_id, provider, url, now))
+        except sqlite3.Error as e:
+            print(f"Error updating the library: {e}")
+
+    def set_latest_chapter(self, title: str, chapter):
+        """Remembers the newest chapter of a tracked series, updated is set whenever a newer or first one is known."""
+        try:
+            with self.db.conn:
+                self.db.conn.execute(
+                    "UPDATE library_series SET updated = ?, latest_chapter = ? "
+                    "WHERE key = ? AND (latest_chapter IS NULL OR latest_chapter < ?)",
+                    (time.time(), float(chapter), self.make_key(title), float(chapter)))
+        except sqlite3.Error as e:
+            print(f"Error updating the library: {e}")
+
+    def save_position(self, title: str, chapter, vertical: int, horizontal: int):
+        """The scroll position in a chapter of a tracked series, for when it is opened again."""
+        try:
+            with self.db.conn:
+                series_id = self._get_series_id(title)
+                if series_id is None:
+                    return
+                self.db.conn.execute(
+                    "INSERT INTO library_chapters (series_id, chapter, read_at, scroll_vertical, scroll_horizontal) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(series_id, chapter) DO UPDATE SET "
+                    "scroll_vertical = excluded.scroll_vertical, scroll_horizontal = excluded.scroll_horizontal",
+                    (series_id, float(chapter), time.time(), vertical, horizontal))
+        except sqlite3.Error as e:
+            print(f"Error updating the library: {e}")
+
+    def get_position(self, title: str, chapter) -> Optional[tuple]:
+        try:
+            row = self.db.conn.execute(
+                "SELECT scroll_vertical, scroll_horizontal FROM library_chapters JOIN library_series "
+                "ON library_series.id = library_chapters.series_id WHERE key = ? AND chapter = ?",
+                (self.make_key(title), float(chapter))).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading the library: {e}")
+            return None
+        return tuple(row) if row is not None and row[0] is not None else None
+
+    def get_chapters_read(self, title: str) -> list:
+        try:
+            rows = self.db.conn.execute(
+                "SELECT chapter FROM library_chapters JOIN library_series "
+                "ON library_series.id = library_chapters.series_id WHERE key = ? ORDER BY chapter",
+                (self.make_key(title),)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading the library: {e}")
+            return []
+        return [self._chapter(chapter) for chapter, in rows]
+
+    def get_provider_url(self, title: str, provider: str) -> Optional[str]:
+        try:
+            row = self.db.conn.execute(
+                "SELECT url FROM library_providers JOIN library_series "
+                "ON library_series.id = library_providers.series_id WHERE key = ? AND library_providers.provider = ?",
+                (self.make_key(title), provider)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading the library: {e}")
+            return None
+        return row[0] if row is not None else None
+
+    def continue_reading(self, limit: int = 50) -> list:
+        return self._entries(f"SELECT {self.entry_columns} FROM library_series AS s WHERE s.last_read IS NOT NULL "
+                             f"ORDER BY s.last_read DESC LIMIT ?", (limit,))
+
+    def recently_updated(self, limit: int = 50) -> list:
+        return self._entries(f"SELECT {self.entry_columns} FROM library_series AS s WHERE s.updated IS NOT NULL "
+                             f"ORDER BY s.updated DESC LIMIT ?", (limit,))
+
+    def search(self, text: str, limit: int = 50) -> list:
+        """Series whose title words start with the words in text, the best matches first."""
+        words = text.split()
+        if not words:
+            return self.continue_reading(limit)
+        if self.has_search_index:
+            query = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+            return self._entries(f"SELECT {self.entry_columns} FROM library_search JOIN library_series AS s "
+                                 f"ON s.id = library_search.rowid WHERE library_search MATCH ? ORDER BY rank LIMIT ?",
+                                 (query, limit))
+        pattern = "%" + self.make_key(text).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self._entries(f"SELECT {self.entry_columns} FROM library_series AS s WHERE s.key LIKE ? ESCAPE '\\' "
+                             f"ORDER BY s.last_read DESC LIMIT ?", (pattern, limit))
+
+    def get_recent_titles(self, limit: int = 50) -> list:
+        """Titles of the last read series, oldest first like the old recent_titles setting."""
+        return [entry["title"].lower() for entry in reversed(self.continue_reading(limit))]
+
+    def import_titles(self, titles: list):
+        """Adds titles from the old recent_titles setting (oldest first), keeps their order as read times."""
+        now = time.time()
+        try:
+            with self.db.conn:
+                self.db.conn.executemany(
+                    "INSERT INTO library_series (key, title, added, last_read) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO NOTHING",
+                    [(self.make_key(title), title, now, now - len(titles) + i) for i, title in enumerate(titles)])
+        except sqlite3.Error as e:
+            print(f"Error importing into the library: {e}")
+
+    def __len__(self):
+        try:
+            return self.db.conn.execute("SELECT COUNT(*) FROM library_series").fetchone()[0]
+        except sqlite3.Error:
+            return 0
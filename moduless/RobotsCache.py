@@ -0,0 +1,165 @@
+from urllib.parse import urlparse
+from typing import Optional
+import threading
+import json
+import time
+import re
+import os
+
+from modules.HttpClient import HttpClient
+
+
+class RobotsRules:
+    """
+    The Allow and Disallow rules of one user-agent group. Plain paths are kept in a prefix trie, so a check only walks
+    the characters of the path, paths with * or $ wildcards are compiled to regular expressions. Like RFC 9309 the
+    longest matching rule decides, if an Allow and a Disallow rule are equally long the Allow rule wins.
+    """
+    _END = ""  # Marks the end of a rule path in the trie, never a single character
+
+    def __init__(self, disallowed=(), allowed=()):
+        self.trie = {}
+        self.patterns = []  # (length of the rule, allowed, compiled pattern)
+        for path in disallowed:
+            self.add(path, False)
+        for path in allowed:
+            self.add(path, True)
+
+    def add(self, path: str, allowed: bool = False):
+        if "*" in path or path.endswith("$"):
+            pattern = re.escape(path).replace(r"\*", ".*")
+            if pattern.endswith(r"\$"):
+                pattern = pattern[:-2] + "$"
+            self.patterns.append((len(path), allowed, re.compile(pattern)))
+            return
+        node = self.trie
+        for char in path:
+            node = node.setdefault(char, {})
+        node[self._END] = node.get(self._END, False) or allowed  # Allow wins over an identical Disallow
+
+    def is_allowed(self, path: str) -> bool:
+        best = (-1, True)  # (length, allowed) of the longest matching rule, nothing matching means allowed
+        node = self.trie
+        for depth, char in enumerate(path):
+            if self._END in node:
+                best = (depth, node[self._END])
+            node = node.get(char)
+            if node is None:
+                break
+        else:
+            if self._END in node:
+                best = (len(path), node[self._END])
+        for length, allowed, pattern in self.patterns:
+            if (length, allowed) > best and pattern.match(path):
+                best = (length, allowed)
+        return best[1]
+
+
+class RobotsCache:
+    """
+    Parsed robots.txt files per domain. Entries are kept for ttl seconds and saved to path, so crawlability checks are
+    in-memory lookups that survive restarts. If a refresh fails an outdated entry is still used.
+    """
+    def __init__(self, path: Optional[str] = None, ttl: float = 24 * 60 * 60, timeout: float = 10):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        # domain -> {"fetched": timestamp, "groups": {user-agent: {"allow": [paths], "disallow": [paths]}}}
+        self.entries = {}
+        self.rules = {}  # (domain, user-agent) -> RobotsRules
+        self.load()
+
+    @staticmethod
+    def parse(text: str) -> dict:
+        """Returns the Allow and Disallow paths of every user-agent, consecutive User-agent lines share their rules."""
+        groups = {}
+        agents = []
+        in_rules = False
+        for line in text.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            field, value = (part.strip() for part in line.split(":", 1))
+            field = field.lower()
+            if field == "user-agent":
+                if in_rules:
+                    agents, in_rules = [], False
+                agents.append(value.lower())
+                groups.setdefault(value.lower(), {"allow": [], "disallow": []})
+            elif agents and field in ("disallow", "allow", "crawl-delay"):
+                in_rules = True
+                if field != "crawl-delay" and value:
+                    for agent in agents:
+                        groups[agent][field].append(value)
+        return groups
+
+    def _fetch(self, scheme: str, domain: str) -> dict:
+        response = HttpClient.get_instance().get(f"{scheme}://{domain}/robots.txt", timeout=self.timeout)
+        # If robots.txt does not exist, assume everything is crawlable
+        groups = self.parse(response.text) if response.status_code == 200 else {}
+        return {"fetched": time.time(), "groups": groups}
+
+    def _get_entry(self, scheme: str, domain: str) -> dict:
+        with self.lock:
+            entry = self.entries.get(domain)
+        if entry is not None and time.time() - entry["fetched"] < self.ttl:
+            return entry
+        try:
+            new_entry = self._fetch(scheme, domain)
+        except Exception as e:
+            if entry is None:
+                raise
+            print(f"Could not refresh robots.txt of {domain}, using the cached one: {e}")
+            return entry
+        with self.lock:
+            self.entries[domain] = new_entry
+            for key in [key for key in self.rules if key[0] == domain]:
+                del self.rules[key]
+        self.save()
+        return new_entry
+
+    def is_allowed(self, useragent: str, url: str) -> bool:
+        parsed = urlparse(url)
+        entry = self._get_entry(parsed.scheme or "https", parsed.netloc)
+        agent = useragent.lower()
+        if agent not in entry["groups"]:
+            agent = "*"
+            if agent not in entry["groups"]:
+                return True
+        with self.lock:
+            rules = self.rules.get((parsed.netloc, agent))
+            if rules is None:
+                group = entry["groups"][agent]
+                if isinstance(group, list):  # Cached before Allow rules were kept, only used if a refresh fails
+                    group = {"allow": [], "disallow": group}
+                rules = self.rules[(parsed.netloc, agent)] = RobotsRules(group["disallow"], group["allow"])
+        path = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+        return rules.is_allowed(path)
+
+    def load(self):
+        if self.path is None or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load the robots.txt cache: {e}")
+            return
+        for entry in entries.values():
+            if any(isinstance(group, list) for group in entry.get("groups", {}).values()):
+                entry["fetched"] = 0  # Saved without the Allow rules, refresh it
+        with self.lock:
+            self.entries = entries  # Outdated entries get refreshed on use
+
+    def save(self):
+        if self.path is None:
+            return
+        temp_path = f"{self.path}.tmp"
+        with self.lock:  # Also keeps two threads from writing the temp file at once
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.entries, f)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"Could not save the robots.txt cache: {e}")
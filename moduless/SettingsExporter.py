@@ -0,0 +1,277 @@
+from typing import Optional
+import threading
+import sqlite3
+import json
+import time
+import os
+
+
+class SettingsExporter:
+    """
+    Exports data.db to the settings file on its own thread, so the GUI never waits for the disk. Requests that come in
+    within delay seconds of each other are merged into one export. A .db file is written with sqlite's backup API,
+    a .json file is streamed row by row. "modify" only changes the settings keys that changed since the last export to
+    that file, in a .json file the other rows are streamed through. "overwrite" and "create_new" write a full copy.
+    """
+    json_extensions = (".json", ".yaml", ".yml")
+
+    def __init__(self, db_path: str, delay: float = 2.0):
+        self.db_path = db_path
+        self.delay = delay
+        self.condition = threading.Condition()
+        self.pending = None  # [path, mode, keys], keys None means all of them
+        self.due = 0.0
+        self.busy = False
+        self.thread = None
+        self.exported = {}  # Path -> {key: value} of the settings last written there
+
+    def request(self, path: str, mode: str, keys: Optional[list] = None, delay: Optional[float] = None):
+        """Exports after delay seconds (self.delay if None) unless another request comes in first."""
+        if not path or not path.endswith((".db",) + self.json_extensions) or os.path.isdir(path):
+            return
+        with self.condition:
+            if self.pending is not None and self.pending[:2] == [path, mode]:
+                if keys is None or self.pending[2] is None:
+                    self.pending[2] = None
+                else:
+                    self.pending[2] = sorted(set(self.pending[2]) | set(keys))
+            else:
+                self.pending = [path, mode, None if keys is None else sorted(keys)]
+            self.due = time.monotonic() + (self.delay if delay is None else delay)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="SettingsExporter", daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None or time.monotonic() < self.due:
+                    self.condition.wait(None if self.pending is None else max(self.due - time.monotonic(), 0.0))
+                path, mode, keys = self.pending
+                self.pending = None
+                self.busy = True
+            try:
+                self.export(path, mode, keys)
+            except Exception as e:
+                print(f"Error exporting the settings to {path}: {e}")
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def close(self, timeout: float = 10.0):
+        """Runs a waiting export right away and waits for it, call it before exiting."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            self.due = 0.0
+            self.condition.notify_all()
+            while (self.pending is not None or self.busy) and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+
+    def _connect_source(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=5.0)
+
+    def _read_settings(self, source: sqlite3.Connection, keys: Optional[list]) -> dict:
+        if keys is None:
+            return dict(source.execute("SELECT key, value FROM settings").fetchall())
+        placeholders = ', '.join('?' for _ in keys)
+        return dict(source.execute(f"SELECT key, value FROM settings WHERE key IN ({placeholders})", keys).fetchall())
+
+    @staticmethod
+    def _get_tables(source: sqlite3.Connection) -> list:
+        """The tables worth exporting, full text indexes and their shadow tables get rebuilt from their content."""
+        tables = source.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' "
+                                "AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()
+        virtual_tables = [name for name, sql in tables if (sql or "").upper().startswith("CREATE VIRTUAL TABLE")]
+        return [name for name, _ in tables
+                if not any(name == virtual or name.startswith(f"{virtual}_") for virtual in virtual_tables)]
+
+    def export(self, path: str, mode: str, keys: Optional[list] = None):
+        """Exports right away on the calling thread."""
+        if mode == "create_new" and os.path.exists(path):
+            return
+        if mode == "modify" and not os.path.isfile(path):
+            mode = "overwrite"
+        source = self._connect_source()
+        try:
+            source.execute("BEGIN")  # One snapshot for all tables, the GUI thread can keep writing meanwhile
+            exported = self.exported.get(path)
+            if mode == "modify" and exported is None:
+                keys = None  # Nothing is known about the file yet
+            settings = self._read_settings(source, keys)
+            if keys is not None and exported is not None:
+                settings = {key: value for key, value in settings.items() if exported.get(key) != value}
+                if not settings:
+                    return  # Changed and changed back
+            if mode == "modify":
+                if path.endswith(".db"):
+                    self._modify_db(path, settings)
+                else:
+                    self._modify_json(path, settings)
+            elif path.endswith(".db"):
+                self._backup_db(source, path)
+            else:
+                self._write_json(path, ((table, self._iter_rows(source, table)) for table in self._get_tables(source)))
+            if exported is None or mode != "modify":
+                exported = self.exported[path] = self._read_settings(source, None)
+            exported.update(settings)
+        finally:
+            source.close()
+        print(f"Exported the settings to {path} ({mode}, {len(settings)} changed keys)")
+
+    @staticmethod
+    def _iter_rows(source: sqlite3.Connection, table: str):
+        cursor = source.execute(f'SELECT * FROM "{table}"')
+        columns = [description[0] for description in cursor.description]
+        for row in cursor:
+            yield dict(zip(columns, row))
+
+    @staticmethod
+    def _write_json(path: str, tables):
+        """Writes tables ((name, rows), ...) one row per line, the rows can be a generator."""
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write("{")
+                for i, (table, rows) in enumerate(tables):
+                    f.write(f"{',' if i else ''}\n    {json.dumps(table)}: [")
+                    separator = "\n        "
+                    for row in rows:
+                        f.write(separator + json.dumps(row))
+                        separator = ",\n        "
+                    f.write("]" if separator == "\n        " else "\n    ]")
+                f.write("\n}\n")
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _modify_json(self, path: str, settings: dict):
+        """Streams the file into its replacement, only the settings rows of the changed keys are different."""
+        tables = _JsonReader(open(path, "r", encoding="utf-8")).iter_tables()  # Closed once it is read to the end
+        self._write_json(path, self._merge_settings(tables, settings))
+
+    @staticmethod
+    def _merge_settings(tables, settings: dict):
+        missing = dict(settings)
+
+        def merge_rows(rows):
+            for row in rows:
+                if isinstance(row, dict) and row.get("key") in settings:
+                    row = dict(row, value=settings[row["key"]])
+                    missing.pop(row["key"], None)
+                yield row
+            for key, value in missing.items():
+                yield {"key": key, "value": value}
+            missing.clear()
+
+        for table, rows in tables:
+            yield table, merge_rows(rows) if table == "settings" else rows
+        if missing:  # The file had no settings table
+            yield "settings", merge_rows([])
+
+    @staticmethod
+    def _modify_db(path: str, settings: dict):
+        target = sqlite3.connect(path, timeout=5.0)
+        try:
+            with target:
+                target.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY NOT NULL, value TEXT)")
+                # Delete and insert instead of an upsert, older settings tables have no unique key
+                target.executemany("DELETE FROM settings WHERE key = ?", [(key,) for key in settings])
+                target.executemany("INSERT INTO settings (key, value) VALUES (?, ?)", list(settings.items()))
+        finally:
+            target.close()
+
+    @staticmethod
+    def _backup_db(source: sqlite3.Connection, path: str):
+        """A consistent copy even while data.db is written to, and the WAL file doesn't need to be checkpointed."""
+        temp_path = f"{path}.tmp"
+        try:
+            target = sqlite3.connect(temp_path)
+            try:
+                source.backup(target)
+                target.execute("PRAGMA journal_mode = delete")  # A single file, without -wal and -shm next to it
+            finally:
+                target.close()
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+class _JsonReader:
+    """
+    Reads a json object of tables ({"name": [row, ...], ...}) one row at a time, so a big file is never in memory as
+    a whole. Every table has to be read to its end before the next one.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, file):
+        self.file = file
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+
+    def _fill(self) -> bool:
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer) or not self._fill():
+                return self.buffer[self.position:self.position + 1]
+
+    def _expect(self, characters: str) -> str:
+        character = self._peek()
+        if not character or character not in characters:
+            raise ValueError(f"Expected one of {characters!r} in the json file, found {character!r}")
+        self.position += 1
+        return character
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            if end == len(self.buffer) and self._fill():  # A number could go on in the next chunk
+                continue
+            self.position = end
+            return value
+
+    def _rows(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(",]") == "]":
+                return
+
+    def iter_tables(self):
+        try:
+            self._expect("{")
+            if self._peek() == "}":
+                return
+            while True:
+                table = self._value()
+                self._expect(":")
+                rows = self._rows()
+                yield table, rows
+                for _ in rows:  # Skips whatever the caller didn't read
+                    pass
+                if self._expect(",}") == "}":
+                    return
+        finally:
+            self.file.close()
@@ -0,0 +1,86 @@
+from typing import Optional
+import builtins
+import time
+import json
+import sys
+import os
+
+
+class StartupProfiler:
+    """
+    Records where startup time goes, enabled with --profile-startup or MV_PROFILE_STARTUP=1. Like python -X importtime
+    it times every module import (self and cumulative), which also works in the frozen build, and it keeps the time of
+    named startup phases. Disabled, mark and install do nothing.
+    """
+    _instance = None
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.phases = []  # [(phase, seconds since start), ...]
+        self.imports = {}  # Module name -> [self seconds, cumulative seconds]
+        self._stack = []  # Time spent in nested imports of the imports in progress
+        self._original_import = None
+
+    @classmethod
+    def get_instance(cls) -> "StartupProfiler":
+        if cls._instance is None:
+            cls._instance = cls("--profile-startup" in sys.argv or os.environ.get("MV_PROFILE_STARTUP") == "1")
+        return cls._instance
+
+    def install(self):
+        """Starts timing imports, call it before the heavy imports."""
+        if not self.enabled or self._original_import is not None:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:  # Only time imports that actually load something
+            return self._original_import(name, globals, locals, fromlist, level)
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.perf_counter() - start
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += cumulative
+            self.imports[name] = [cumulative - nested, cumulative]
+
+    def mark(self, phase: str):
+        if self.enabled:
+            self.phases.append((phase, time.perf_counter() - self.start))
+
+    def get_report(self, top: int = 20) -> dict:
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return {"phases": [{"phase": phase, "seconds": round(seconds, 4)} for phase, seconds in self.phases],
+                "imports": [{"module": name, "self": round(own, 4), "cumulative": round(cumulative, 4)}
+                            for name, (own, cumulative) in slowest]}
+
+    def report(self, path: Optional[str] = None):
+        """Prints the phases and the slowest imports, and saves them as json to path."""
+        if not self.enabled:
+            return
+        self.uninstall()
+        report = self.get_report()
+        print("Startup profile:")
+        previous = 0.0
+        for phase in report["phases"]:
+            print(f"  {phase['seconds']:8.3f}s (+{phase['seconds'] - previous:.3f}s) {phase['phase']}")
+            previous = phase["seconds"]
+        print("Slowest imports (self | cumulative):")
+        for entry in report["imports"]:
+            print(f"  {entry['self']:8.3f}s | {entry['cumulative']:8.3f}s {entry['module']}")
+        if path is not None:
+            try:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(report, f, indent=4)
+            except OSError as e:
+                print(f"Could not save the startup profile: {e}")
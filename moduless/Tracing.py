@@ -0,0 +1,166 @@
+from collections import deque
+from typing import Optional
+import threading
+import time
+import json
+import sys
+import os
+
+
+class Span:
+    """A timed section, use it as a context manager or call start and finish for code that can't use one."""
+    __slots__ = ("tracer", "name", "args", "concurrent", "begin")
+
+    def __init__(self, tracer: "Tracer", name: str, args: dict, concurrent: bool):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.concurrent = concurrent
+        self.begin = None
+
+    def start(self) -> "Span":
+        self.begin = time.perf_counter()
+        return self
+
+    def finish(self, **args):
+        if self.begin is not None:
+            self.args.update(args)
+            self.tracer.record(self.name, self.begin, time.perf_counter(), self.args, self.concurrent)
+            self.begin = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.finish()
+        return False
+
+
+class _NullSpan:
+    """What a disabled tracer hands out, shared so a disabled span costs one call."""
+    __slots__ = ()
+
+    def start(self):
+        return self
+
+    def finish(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Named spans and counters for the hot paths (url resolution, robots checks, page downloads, decoding, scaling and
+    layout), enabled with --trace, MV_TRACE=1 or the tracing setting. The last max_events spans are kept for a Chrome
+    trace (chrome://tracing or ui.perfetto.dev) and every span name keeps its count, total and maximum for the stats
+    panel. Disabled, span returns a shared no-op and count returns right away.
+    """
+    _instance = None
+    max_events = 50000
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.events = deque(maxlen=self.max_events)
+        self.stats = {}  # Span name -> [count, total seconds, max seconds]
+        self.counters = {}  # Counter name -> value
+        self._next_id = 0
+
+    @classmethod
+    def get_instance(cls) -> "Tracer":
+        if cls._instance is None:
+            cls._instance = cls("--trace" in sys.argv or os.environ.get("MV_TRACE") == "1")
+        return cls._instance
+
+    def set_enabled(self, enabled: bool):
+        self.enabled = enabled
+
+    def span(self, name: str, concurrent: bool = False, **args):
+        """concurrent spans overlap others on the same thread (asyncio tasks) and get their own row in the trace."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, args, concurrent)
+
+    def count(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            value = self.counters[name]
+        self.events.append(("C", name, time.perf_counter(), 0.0, threading.get_ident(), {name: value}, None))
+
+    def record(self, name: str, begin: float, end: float, args: Optional[dict] = None, concurrent: bool = False):
+        duration = end - begin
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                self.stats[name] = [1, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+            if concurrent:
+                self._next_id += 1
+            event_id = self._next_id if concurrent else None
+        self.events.append(("X", name, begin, duration, threading.get_ident(), args or {}, event_id))
+
+    def reset(self):
+        with self.lock:
+            self.events.clear()
+            self.stats.clear()
+            self.counters.clear()
+
+    def get_stats(self) -> list:
+        """Every span name as a dict, the slowest in total first."""
+        with self.lock:
+            stats = sorted(self.stats.items(), key=lambda item: item[1][1], reverse=True)
+        return [{"name": name, "count": count, "total": total, "mean": total / count, "max": longest}
+                for name, (count, total, longest) in stats]
+
+    def get_counters(self) -> dict:
+        with self.lock:
+            return dict(self.counters)
+
+    def get_trace(self) -> dict:
+        """The recorded events in the Chrome trace event format, the stats and counters go into otherData."""
+        pid = os.getpid()
+        trace_events = []
+        for kind, name, begin, duration, tid, args, event_id in list(self.events):
+            timestamp = round((begin - self.origin) * 1_000_000, 1)
+            if event_id is not None:  # Async begin and end, so overlapping spans don't break the nesting
+                trace_events.append({"name": name, "cat": "mv", "ph": "b", "id": event_id, "ts": timestamp,
+                                     "pid": pid, "tid": tid, "args": args})
+                trace_events.append({"name": name, "cat": "mv", "ph": "e", "id": event_id,
+                                     "ts": round(timestamp + duration * 1_000_000, 1), "pid": pid, "tid": tid})
+            elif kind == "X":
+                trace_events.append({"name": name, "cat": "mv", "ph": "X", "ts": timestamp,
+                                     "dur": round(duration * 1_000_000, 1), "pid": pid, "tid": tid, "args": args})
+            else:
+                trace_events.append({"name": name, "cat": "mv", "ph": "C", "ts": timestamp, "pid": pid, "tid": tid,
+                                     "args": args})
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms",
+                "otherData": {"stats": self.get_stats(), "counters": self.get_counters()}}
+
+    def export(self, path: str) -> bool:
+        """Saves the trace to path, replacing the last one."""
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.get_trace(), f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not save the trace: {e}")
+            return False
+        print(f"Saved {len(self.events)} trace events to {path}")
+        return True
@@ -0,0 +1,158 @@
+from typing import Optional
+import threading
+import bisect
+import json
+import time
+import os
+
+
+class ChapterIndex:
+    """
+    The available chapters of a series in order, with their urls. The neighbours of a listed chapter are found in O(1),
+    of any other chapter with a binary search.
+    """
+    def __init__(self, chapters):
+        chapters = sorted({float(chapter): url for chapter, url in chapters}.items())
+        self.chapters = [int(chapter) if chapter.is_integer() else chapter for chapter, _ in chapters]
+        self.urls = [url for _, url in chapters]
+        self.positions = {chapter: i for i, chapter in enumerate(self.chapters)}
+
+    def __len__(self):
+        return len(self.chapters)
+
+    def get_url(self, chapter) -> Optional[str]:
+        position = self.positions.get(chapter)
+        return None if position is None else self.urls[position]
+
+    def next(self, chapter):
+        position = self.positions.get(chapter)
+        position = bisect.bisect_right(self.chapters, chapter) if position is None else position + 1
+        return self.chapters[position] if position < len(self.chapters) else None
+
+    def previous(self, chapter):
+        position = self.positions.get(chapter)
+        position = bisect.bisect_left(self.chapters, chapter) if position is None else position
+        return self.chapters[position - 1] if position > 0 else None
+
+
+class UrlCache:
+    """
+    Remembers resolved URLs per provider and series, the series URL, the URL of every chapter and the URL template of
+    the chapters, so the next chapter can be predicted instead of searched for. Providers that can list all chapters
+    of a series also get a chapter index here. Everything is saved to path.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.lock = threading.Lock()
+        # "provider|title" -> {"url": series url, "template": [prefix, suffix], "chapters": {chapter: url},
+        #                      "index": {"fetched": timestamp, "chapters": [[chapter, url], ...]}}
+        self.series = {}
+        self.indexes = {}  # "provider|title" -> ChapterIndex of the stored index
+        self.load()
+
+    @staticmethod
+    def make_key(provider: str, title: str) -> str:
+        return f"{provider}|{' '.join(title.lower().split())}"
+
+    @staticmethod
+    def make_template(url: str, chapter_str: str) -> Optional[list]:
+        """Splits url around the chapter number, returns None if the number isn't in there on its own."""
+        index = url.rfind(chapter_str)
+        if index == -1:
+            return None
+        prefix, suffix = url[:index], url[index + len(chapter_str):]
+        if prefix[-1:].isdigit() or suffix[:1].isdigit():  # Only a part of another number, like the 1 in 12
+            return None
+        return [prefix, suffix]
+
+    def _get_series(self, provider: str, title: str) -> dict:
+        return self.series.setdefault(self.make_key(provider, title), {"url": None, "template": None, "chapters": {}})
+
+    def get_series_url(self, provider: str, title: str) -> Optional[str]:
+        with self.lock:
+            return self.series.get(self.make_key(provider, title), {}).get("url")
+
+    def store_series_url(self, provider: str, title: str, url: str):
+        with self.lock:
+            self._get_series(provider, title)["url"] = url
+        self.save()
+
+    def get_chapter_url(self, provider: str, title: str, chapter_str: str) -> Optional[str]:
+        with self.lock:
+            return self.series.get(self.make_key(provider, title), {}).get("chapters", {}).get(chapter_str)
+
+    def store_chapter_url(self, provider: str, title: str, chapter_str: str, url: str):
+        """Remembers the chapter url and learns the url template of the series from it."""
+        with self.lock:
+            series = self._get_series(provider, title)
+            series["chapters"][chapter_str] = url
+            template = self.make_template(url, chapter_str)
+            if template is not None:
+                series["template"] = template
+        self.save()
+
+    def predict_chapter_url(self, provider: str, title: str, chapter_str: str) -> Optional[str]:
+        with self.lock:
+            template = self.series.get(self.make_key(provider, title), {}).get("template")
+        if template is None:
+            return None
+        prefix, suffix = template
+        return f"{prefix}{chapter_str}{suffix}"
+
+    def get_chapter_index(self, provider: str, title: str, max_age: float) -> Optional[ChapterIndex]:
+        """The stored chapter index of the series if it is younger than max_age seconds."""
+        key = self.make_key(provider, title)
+        with self.lock:
+            index = self.series.get(key, {}).get("index")
+            if index is None or time.time() - index["fetched"] >= max_age:
+                return None
+            if key not in self.indexes:
+                self.indexes[key] = ChapterIndex(index["chapters"])
+            return self.indexes[key]
+
+    def store_chapter_index(self, provider: str, title: str, chapters: list) -> ChapterIndex:
+        key = self.make_key(provider, title)
+        chapter_index = ChapterIndex(chapters)
+        with self.lock:
+            self._get_series(provider, title)["index"] = {
+                "fetched": time.time(), "chapters": [[chapter, url] for chapter, url in zip(chapter_index.chapters,
+                                                                                             chapter_index.urls)]}
+            self.indexes[key] = chapter_index
+        self.save()
+        return chapter_index
+
+    def forget_chapter_url(self, provider: str, title: str, chapter_str: str):
+        """Drops a chapter url that didn't work anymore, the template and series url go with it as they are outdated."""
+        with self.lock:
+            series = self.series.get(self.make_key(provider, title))
+            if series is None:
+                return
+            url = series["chapters"].pop(chapter_str, None)
+            if url is not None and self.make_template(url, chapter_str) == series["template"]:
+                series["template"] = None
+                series["url"] = None
+        self.save()
+
+    def load(self):
+        if self.path is None or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                series = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load the url cache: {e}")
+            return
+        with self.lock:
+            self.series = series
+
+    def save(self):
+        if self.path is None:
+            return
+        temp_path = f"{self.path}.tmp"
+        with self.lock:  # Also keeps two threads from writing the temp file at once
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.series, f)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"Could not save the url cache: {e}")
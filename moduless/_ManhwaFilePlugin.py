@@ -10,6 +10,7 @@ from urllib.parse import urlencode, urlunparse, quote_plus
 from urllib.request import urlopen, Request
 from urllib.parse import urljoin, urlparse
 from aplustools.web import webtools as wt
+from modules.HttpClient import HttpClient
 
 # Disable only the specific InsecureRequestWarning
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -113,7 +114,7 @@ class ManhwaFilePlugin:
             if page['type'] == 'base64':
                 image_data = base64.b64decode(page['data'])
             elif page['type'] == 'url':
-                response = requests.get(page['data'])
+                response = HttpClient.get_instance().get(page['data'])
                 image_data = response.content
             else:
                 print(f"Unknown type: {page['type']}")
@@ -171,7 +171,7 @@ class AutoProviderPluginManhwaClan(AutoProviderPlugin):
         }
 
         # Send the first POST request
-        response = requests.post(url, headers=headers, data=data)
+        response = self.session.post(url, headers=headers, data=data)
 
         # Check for a successful response (HTTP status code 200)
         if response.status_code == 200:
@@ -217,7 +217,7 @@ class AutoProviderPluginManhwaClan(AutoProviderPlugin):
         }
 
         # Send the first POST request
-        response = requests.post(url, headers=headers, data=data)
+        response = self.session.post(url, headers=headers, data=data)
 
         # Check for a successful response (HTTP status code 200)
         if response.status_code == 200:
@@ -127,7 +127,7 @@ def generate_theme_stylesheet(
             background-color: {hover_background};
         }}
 
-        ImageLabel {{
+        PageCanvas {{
             padding: 0;
             background-color: transparent;
         }}
@@ -316,7 +316,7 @@ class Themes:
                 padding: 5px;
                 background-color: #d6d6d6; /*Before #d0d0d0, made it 6 lighter*/
             }
-            ImageLabel {
+            PageCanvas {
                 padding: 0;
                 background-color: transparent;
             }
@@ -431,7 +431,7 @@ class Themes:
                     padding: 5px;
                     background-color: #d6d6d6; /*Before #d0d0d0, made it 6 lighter*/
                 }
-                ImageLabel {
+                PageCanvas {
                     padding: 0;
                     background-color: transparent;
                 }
@@ -551,7 +551,7 @@ class Themes:
                 padding: 5px;
                 background-color: #4f4f4f; /*Before #555555, made it 6 darker*/
             }
-            ImageLabel {
+            PageCanvas {
                 padding: 0;
                 background-color: transparent;
             }
@@ -660,7 +660,7 @@ class Themes:
                 padding: 5px;
                 background-color: #555555;
             }
-            ImageLabel {
+            PageCanvas {
                 padding: 0;
                 background-color: transparent;
             }
@@ -779,7 +779,7 @@ class Themes:
             padding: 5px;
             background-color: {alternate_base_color}; /* Before #d6d6d6 */
         }}
-        ImageLabel {{
+        PageCanvas {{
             padding: 0;
             background-color: transparent;
         }}
@@ -891,7 +891,7 @@ class Themes:
                 padding: 5px;
                 background-color: {alternate_base_color};
             }}
-            ImageLabel {{
+            PageCanvas {{
                 padding: 0;
                 background-color: transparent;
             }}
@@ -1,32 +1,39 @@
 # Copyright xbyteW 2024
 import config  # Configures python environment before anything else is done
+from modules.StartupProfiler import StartupProfiler
+StartupProfiler.get_instance().install()  # Only does something with --profile-startup
 
 from PySide6.QtWidgets import (QApplication, QLabel, QVBoxLayout, QWidget, QMainWindow, QCheckBox, QHBoxLayout,
                                QScroller, QSpinBox, QPushButton, QGraphicsOpacityEffect, QScrollerProperties, QFrame,
                                QComboBox, QFormLayout, QLineEdit, QMessageBox, QScrollBar, QSizePolicy)
-from PySide6.QtGui import QDesktopServices, QPixmap, QIcon, QDoubleValidator, QFont, QImage
-from PySide6.QtCore import Qt, QTimer, QPropertyAnimation, QRect, QUrl
+from PySide6.QtGui import QDesktopServices, QPixmap, QIcon, QDoubleValidator, QFont
+from PySide6.QtCore import Qt, QTimer, QPropertyAnimation, QRect, QUrl, Signal
 # from PySide6.QtMultimediaWidgets import QVideoWidget
 # from PySide6.QtWebEngineWidgets import QWebEngineView
 from PySide6.QtGui import QColor
 
 from modules.AutoProviderPlugin import AutoProviderPlugin, AutoProviderBaseLike, AutoProviderBaseLike2
-from modules.Classes import (CustomProgressDialog, ImageLabel, SearchWidget, AdvancedQMessageBox,
+from modules.Classes import (CustomProgressDialog, ImagePage, SearchWidget, AdvancedQMessageBox, LibraryDialog,
                              CustomComboBox, Settings, QAdvancedSmoothScrollingArea, AutoProviderManager,
-                             AdvancedSettingsDialog)
+                             AdvancedSettingsDialog, ImageLoader, PageHeights, PageCanvas, ProviderIconCache)
+from modules.ChapterCache import ChapterCache
+from modules.HttpClient import HttpClient
+from modules.Library import Library
+from modules.SettingsExporter import SettingsExporter
+from modules.RobotsCache import RobotsCache
+from modules.Tracing import Tracer
+from modules.UrlCache import UrlCache
 from modules.themes import Themes
 
 # Apt stuff ( update to newer version )
 from aplustools.io.loggers import monitor_stdout
-from aplustools.data.updaters import VersionNumber
 from aplustools.io.environment import System
 from aplustools import set_dir_to_ex
 
 from urllib.parse import urlparse
 import requests
-import sqlite3
-import random
-import shutil
+import threading
+import bisect
 import json
 import math
 import time
@@ -34,23 +41,31 @@ import sys
 import os
 
 import multiprocessing
-import stdlib_list
 multiprocessing.freeze_support()
-hiddenimports = list(stdlib_list.stdlib_list())
 
-set_dir_to_ex()
-os.chdir(os.path.join(os.getcwd(), './_internal'))
+
+def get_hidden_imports():
+    """Every stdlib module, only needed when packaging. The import keeps stdlib_list in the build."""
+    import stdlib_list
+    return list(stdlib_list.stdlib_list())
+
+
+StartupProfiler.get_instance().mark("imports")
 
 
 class MainWindow(QMainWindow):
+    update_info_fetched = Signal(object)
+    page_ready = Signal(str, str)  # Slot name, file path, emitted from the download threads
+    chapter_downloaded = Signal(str, list)  # Slot name, failed pages
+
     def __init__(self, app):
         super().__init__()
         self.app = app
 
-        self.data_folder = os.path.abspath('./data').strip("/")
-        self.cache_folder = os.path.abspath('./cache').strip("/")
-        self.modules_folder = os.path.abspath('./modules').strip("/")
-        self.extensions_folder = os.path.abspath('./extensions').strip("/")
+        self.data_folder = os.path.abspath('./data')
+        self.cache_folder = os.path.abspath('./cache')
+        self.modules_folder = os.path.abspath('./modules')
+        self.extensions_folder = os.path.abspath('./extensions')
 
         self.logger = monitor_stdout(f"{self.data_folder}/logs.txt")
 
@@ -60,12 +75,26 @@ class MainWindow(QMainWindow):
         self.setWindowIcon(QIcon(f"{self.data_folder}/Untitled-1-noBackground.png"))
 
         db_path = f"{self.data_folder}/data.db"
+        self.exporter = SettingsExporter(db_path)
 
-        if int(self.system.get_major_os_version()) <= 10:
-            self.settings = Settings(db_path, {"geometry": "100, 100, 800, 630", "advanced_settings": '{"recent_titles": [], "themes": {"light": "light", "dark": "dark", "font": "Segoe UI"}, "settings_file_path": "", "settings_file_mode": "overwrite", "misc": {"auto_export": false, "num_workers": 10}}',}, self.export_settings)
+        if self.system.get_os() == "Windows" and int(self.system.get_major_os_version()) <= 10:
+            self.settings = Settings(db_path, {"geometry": "100, 100, 800, 630", "advanced_settings": '{"recent_titles": [], "themes": {"light": "light", "dark": "dark", "font": "Segoe UI"}, "settings_file_path": "", "settings_file_mode": "overwrite", "misc": {"auto_export": false, "num_workers": 10, "max_cache_size_mb": 500, "image_memory_mb": 256, "scaled_cache_mb": 128, "tracing": false}}',}, self.auto_export_settings)
         else:
-            self.settings = Settings(db_path, {"geometry": "100, 100, 800, 630"}, self.export_settings)
+            self.settings = Settings(db_path, {"geometry": "100, 100, 800, 630"}, self.auto_export_settings)
         # self.settings.set_geometry([100, 100, 800, 630])
+        self.profiler = StartupProfiler.get_instance()
+        self.profiler.mark("settings")
+        self.tracer = Tracer.get_instance()
+        self.tracer.set_enabled(self.tracer.enabled or self.settings.get_misc("tracing", False))
+        self.library = Library(self.settings.db)
+        recent_titles = self.settings.get_cached("advanced_settings").get("recent_titles")
+        if recent_titles:  # Recent titles used to be a list in the advanced settings
+            self.library.import_titles(recent_titles)
+            advanced_settings = self.settings.get_advanced_settings()
+            advanced_settings["recent_titles"] = []
+            self.settings.set_advanced_settings(advanced_settings)
+        self.reading = (self.settings.get_title(), self.settings.get_chapter())  # What is shown right now
+        self.failed_downloads = {}  # Slot name -> failed pages of downloads that finished while a chapter loaded
 
         self.os_theme = self.system.get_windows_theme() or os.environ.get('MV_THEME') or "light"
         self.theme = None
@@ -74,25 +103,48 @@ class MainWindow(QMainWindow):
         x, y, height, width = self.settings.get_geometry()
         self.setGeometry(x, y + 31, height, width)  # Somehow saves it as 31 pixels less
         self.setup_gui()
+        self.profiler.mark("theme and gui setup")
 
         # Advanced setup
-        self.provider_dict = self.provider = None
+        self.image_loader = ImageLoader(self, self.get_scaled_cache_size())
+        self.pages_loaded_timer = QTimer(self)  # Pages finish decoding one after another, react to them at once
+        self.pages_loaded_timer.setSingleShot(True)
+        self.pages_loaded_timer.setInterval(0)
+        self.pages_loaded_timer.timeout.connect(self.pages_loaded)
+        self.image_loader.page_loaded.connect(self.page_loaded)
+        self.chapter_cache = ChapterCache(os.path.join(self.cache_folder, "store"),
+                                          self.get_max_cache_size())
+        # Providers empty the files directly in the cache folder when they are switched
+        self.state_folder = os.path.join(self.cache_folder, "state")
+        os.makedirs(self.state_folder, exist_ok=True)
+        AutoProviderPlugin.set_robots_cache(RobotsCache(os.path.join(self.state_folder, "robots.json")))
+        self.url_cache = UrlCache(os.path.join(self.state_folder, "urls.json"))
+        self.provider_icons = ProviderIconCache(os.path.join(self.state_folder, "icons"))
+        self.provider_manager = self.provider_dict = self.provider = None
         self.provider_combobox.currentIndexChanged.disconnect()
         self.reload_providers()
         self.switch_provider(self.settings.get_provider())
         self.provider_combobox.currentIndexChanged.connect(self.change_provider)
+        self.profiler.mark("providers")
 
         self.reload_window_title()
 
         # Scaling stuff
         self.previous_scrollarea_width = self.scrollarea.width()
+        self.content_width = None
         self.content_paths = self.get_content_paths()
+        self.content_pages = []
+        self.page_heights = PageHeights()
+        self.page_canvas.set_pages(self.content_pages, self.page_heights)
+        self.active_pages = set()  # Pages that are loaded or loading
+        self.force_rescale = False
         self.task_successful = False
         self.threading = False
 
         self.reload_gui()
         self.downscaling = self.downscale_checkbox.isChecked()
         self.upscaling = self.upscale_checkbox.isChecked()
+        self.lazy_loading = self.lazy_loading_checkbox.isChecked()
 
         if not self.hover_effect_all_checkbox.isChecked():
             self.reload_hover_effect_all_setting()
@@ -108,25 +160,43 @@ class MainWindow(QMainWindow):
         self.reload_stay_on_top_setting()
 
         self.update_sensitivity(int(self.settings.get_scrolling_sensitivity() * 10))
+        self.profiler.mark("gui settings")
 
         self.show()
-        self.check_for_update()
+        self.profiler.mark("window shown")
 
-        self.force_rescale = False
-        self.content_widgets = []
         self.reload_content()
-        self.force_rescale = True
+        self.request_rescale()
+        self.profiler.mark("content loaded")
+        self.scrollarea.verticalScrollBar().valueChanged.connect(self.update_visible_pages)
+        self.provider.prefetch_neighbours()
         QTimer.singleShot(50, lambda: (
             self.scrollarea.verticalScrollBar().setValue(self.settings.get_last_scroll_positions()[0]),
             self.scrollarea.horizontalScrollBar().setValue(self.settings.get_last_scroll_positions()[1])
         ))
         self.last_reload_ts = time.time()
+        self.update_info_fetched.connect(self.show_update_info)
+        self.settings.subscribe("advanced_settings", self.apply_advanced_settings)
+        QTimer.singleShot(0, self.check_for_update)  # Once the chapter is on screen
+        QTimer.singleShot(0, lambda: (self.profiler.mark("first event loop turn"),
+                                      self.profiler.report(os.path.join(self.data_folder, "startup_profile.json"))))
 
     def check_for_update(self):
+        """Fetches the update info in the background, show_update_info gets it on the GUI thread."""
+        threading.Thread(target=self.fetch_update_info, name="UpdateCheck", daemon=True).start()
+
+    def fetch_update_info(self):
         try:
-            response = requests.get("https://raw.githubusercontent.com/adalfarus/update_check/main/mv/update.json",
-                                    timeout=1)
+            result = HttpClient.get_instance().get(
+                "https://raw.githubusercontent.com/adalfarus/update_check/main/mv/update.json", timeout=5)
         except Exception as e:
+            result = e
+        self.update_info_fetched.emit(result)
+
+    def show_update_info(self, response):
+        from aplustools.data.updaters import VersionNumber
+        if isinstance(response, Exception):
+            e = response
             title = "Info"
             text = "There was an error when checking for updates."
             description = f"{e}"
@@ -250,6 +320,11 @@ class MainWindow(QMainWindow):
         next_chapter_button = QPushButton("Next")
         buttons_layout.addWidget(next_chapter_button)
 
+        # All pages get painted by one widget, the buttons follow it
+        self.page_canvas = PageCanvas()
+        self.content_layout.addWidget(self.page_canvas)
+        self.content_layout.addWidget(self.buttons_widget)
+
         # Add a transparent image on the top left
         self.transparent_image = QLabel(self)
         self.transparent_image.setObjectName("transparentImage")
@@ -403,7 +478,8 @@ class MainWindow(QMainWindow):
         [side_menu_layout.addRow(QWidget()) for _ in range(3)]
 
         self.save_last_titles_checkbox = QCheckBox("Save last titles")
-        side_menu_layout.addRow(self.save_last_titles_checkbox)
+        library_button = QPushButton("Library")
+        side_menu_layout.addRow(self.save_last_titles_checkbox, library_button)
         export_settings_button = QPushButton("Export Settings")
         advanced_settings_button = QPushButton("Adv Settings")
         side_menu_layout.addRow(export_settings_button, advanced_settings_button)
@@ -412,15 +488,17 @@ class MainWindow(QMainWindow):
         self.menu_button = QPushButton(QIcon(f"{self.data_folder}/empty.png"), "", self.centralWidget())
         self.menu_button.setFixedSize(40, 40)
 
-        # Timer to regularly check for resizing needs
-        timer = QTimer(self)
-        timer.start(500)
+        # Relayout once after resizes and width changes
+        self.relayout_timer = QTimer(self)
+        self.relayout_timer.setSingleShot(True)
+        self.relayout_timer.setInterval(0)
 
         # Connect GUI components
         self.search_bar_toggle_button.clicked.connect(self.toggle_search_bar)
         # Checkboxes
         self.downscale_checkbox.toggled.connect(self.downscale_checkbox_toggled)
         self.upscale_checkbox.toggled.connect(self.upscale_checkbox_toggled)
+        self.lazy_loading_checkbox.toggled.connect(self.lazy_loading_checkbox_toggled)
         self.borderless_checkbox.toggled.connect(self.reload_borderless_setting)
         self.acrylic_menus_checkbox.toggled.connect(self.reload_acrylic_menus_setting)
         self.acrylic_background_checkbox.toggled.connect(self.reload_acrylic_background_setting)
@@ -443,14 +521,20 @@ class MainWindow(QMainWindow):
         previous_chapter_button_side_menu.clicked.connect(self.previous_chapter)
         next_chapter_button_side_menu.clicked.connect(self.next_chapter)
         advanced_settings_button.clicked.connect(self.advanced_settings)  # Menu
+        library_button.clicked.connect(self.open_library)  # Menu
         export_settings_button.clicked.connect(self.export_settings)  # Menu
         blacklist_button.clicked.connect(self.blacklist_current_url)  # Menu
         # Rest
         self.provider_combobox.currentIndexChanged.connect(self.change_provider)  # Menu
         self.provider_type_combobox.currentIndexChanged.connect(self.change_provider_type)
         self.side_menu_animation.valueChanged.connect(self.side_menu_animation_value_changed)  # Menu
-        timer.timeout.connect(self.timer_tick)
+        self.relayout_timer.timeout.connect(self.relayout)
+        self.scrollarea.resized.connect(self.relayout_timer.start)
+        QApplication.styleHints().colorSchemeChanged.connect(self.os_theme_changed)
+        self.page_ready.connect(self.on_page_ready)
+        self.chapter_downloaded.connect(self.on_chapter_downloaded)
         self.search_bar_animation.valueChanged.connect(self.search_bar_animation_value_changed)
+        self.search_widget.sourceSelected.connect(self.selected_result_source)
         self.search_widget.selectedItem.connect(self.selected_chosen_result)
         self.scroll_sensitivity_scroll_bar.valueChanged.connect(self.update_sensitivity)
 
@@ -476,8 +560,49 @@ class MainWindow(QMainWindow):
     def toggle_save_last_titles_checkbox(self):
         self.settings.set_save_last_titles(self.save_last_titles_checkbox.isChecked())
 
+    def apply_advanced_settings(self, advanced_settings: dict):
+        """Runs whenever the advanced settings change, also when a settings file got loaded."""
+        font = QFont(advanced_settings["themes"]["font"], self.font().pointSize())
+        if font.family() != self.font().family():
+            self.setFont(font)
+            for child in self.findChildren(QWidget):
+                child.setFont(font)
+            self.update()
+
+        if self.provider is not None:
+            self.provider.set_num_workers(advanced_settings["misc"]["num_workers"])
+        self.chapter_cache.set_max_size(self.get_max_cache_size())
+        self.image_loader.cache.set_max_size(self.get_scaled_cache_size())
+        self.tracer.set_enabled(advanced_settings["misc"].get("tracing", False))
+        self.update_visible_pages()
+
+    def open_library(self):
+        dialog = LibraryDialog(parent=self, library=self.library)
+        dialog.exec()
+        if dialog.selected_entry is not None:
+            self.open_library_entry(dialog.selected_entry)
+
+    def open_library_entry(self, entry: dict):
+        """Continues a series from the library at its last read chapter, with the provider it was read with."""
+        provider_name = entry["provider"]
+        if (provider_name and provider_name != self.provider_combobox.currentText()
+                and f"AutoProviderPlugin{provider_name}" in self.provider_dict):
+            self.selected_result_source(provider_name)
+        chapter = str(entry["last_chapter"] if entry["last_chapter"] is not None else 1)
+        self.title_selector.setText(entry["title"])
+        self.title_selector.textChanged.emit(entry["title"])
+        self.chapter_selector.setText(chapter)
+        self.chapter_selector.textChanged.emit(chapter)
+        self.reload_chapter()
+
+    def save_reading_position(self):
+        title, chapter = self.reading
+        self.library.save_position(title, chapter, self.scrollarea.verticalScrollBar().value(),
+                                   self.scrollarea.horizontalScrollBar().value())
+
     def advanced_settings(self):
         settings = self.settings.get_advanced_settings()
+        settings["recent_titles"] = self.library.get_recent_titles()
         default_settings = json.loads(self.settings.get_default_setting("advanced_settings"))
         self.settings.close()
         available_themes = tuple(key for key in Themes.__dict__.keys() if not (key.startswith("__") or key.endswith("__")))
@@ -486,16 +611,8 @@ class MainWindow(QMainWindow):
         if not self.settings.is_open:
             self.settings.connect()
         if dialog.selected_settings is not None:
-            self.settings.set_advanced_settings(dialog.selected_settings)
-            font = QFont(self.settings.get_advanced_settings().get("themes").get("font"), self.font().pointSize())
-            self.setFont(font)
-            for child in self.findChildren(QWidget):
-                child.setFont(font)
-            self.update()
-            self.repaint()
-
-            if settings["misc"]["num_workers"] != dialog.selected_settings["misc"]["num_workers"]:
-                self.switch_provider(self.provider_combobox.currentText())
+            dialog.selected_settings["recent_titles"] = []  # They are in the library
+            self.settings.set_advanced_settings(dialog.selected_settings)  # apply_advanced_settings does the rest
             if (settings["themes"]["light"] != dialog.selected_settings["themes"]["light"]
                     or settings["themes"]["dark"] != dialog.selected_settings["themes"]["dark"]):
                 result = QMessageBox.question(self, "Restart Client?",
@@ -505,150 +622,52 @@ class MainWindow(QMainWindow):
                 if result == QMessageBox.Yes:
                     print("Exiting ...")
                     self.save_settings()
+                    self.settings.flush()
+                    self.exporter.close()
                     sys.stdout.close()
                     self.settings.close()
                     QApplication.exit(1000)
 
-    @staticmethod
-    def fetch_all_data_as_json(db_file, return_dict: bool = False):
-        # Connect to the SQLite database
-        connection = sqlite3.connect(db_file)
-        cursor = connection.cursor()
-
-        try:
-            # Get all table names
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = cursor.fetchall()
-
-            # Dictionary to hold data from all tables
-            all_data = {}
-
-            for table_name in tables:
-                table_name = table_name[0]
-                cursor.execute(f"SELECT * FROM {table_name}")
-
-                # Fetch rows as dictionaries
-                rows = cursor.fetchall()
-                columns = [description[0] for description in cursor.description]
-                all_data[table_name] = [dict(zip(columns, row)) for row in rows]
-
-            if not return_dict:
-                # Convert all data to JSON string
-                json_data = json.dumps(all_data, indent=4)
-                return json_data
-            else:
-                return all_data
-        finally:
-            # Close the cursor and connection
-            cursor.close()
-            connection.close()
-
-    @classmethod
-    def merge_dicts(cls, original, new):
-        """ Recursively merge two dictionaries. """
-        for key, value in new.items():
-            if isinstance(value, dict) and value.get(key):
-                cls.merge_dicts(original.get(key, {}), value)
-            else:
-                original[key] = value
-        return original
-
-    @classmethod
-    def modify_json_file(cls, original_loc, new_data):
-        """ Modify a JSON file with new data. """
-        with open(original_loc, 'r+') as file:
-            existing_data = json.load(file)
-            updated_data = cls.merge_dicts(existing_data, new_data)
-            file.seek(0)
-            file.write(json.dumps(updated_data, indent=4))
-            file.truncate()
-
-    @staticmethod
-    def modify_sqlite_db(db_path, updates):
-        """
-        Modify an SQLite database to update or insert settings.
-        :param db_path: Path to the SQLite database file.
-        :param updates: A dictionary containing key-value pairs to update or insert.
-        """
-        # Connect to the SQLite database
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
-        # Ensuring the table exists
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS settings (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        );
-        """)
-
-        # Prepare the SQL for updating or inserting settings
-        for key, value in updates.items():
-            cursor.execute("""
-            INSERT INTO settings(key, value)
-            VALUES (?, ?)
-            ON CONFLICT(key) DO UPDATE SET value = excluded.value;
-            """, (key, value))
-
-        # Commit the changes and close the connection
-        connection.commit()
-        cursor.close()
-        connection.close()
-
     def export_settings(self):
-        sett = self.settings.get_advanced_settings()
-        loc = sett.get("settings_file_path")
-        mode = sett.get("settings_file_mode")
-
-        if not os.path.isfile(loc) and os.path.exists(loc):
-            return
+        """Exports all settings to the settings file in the background."""
+        self.settings.flush()
+        sett = self.settings.get_cached("advanced_settings")
+        self.exporter.request(sett.get("settings_file_path"), sett.get("settings_file_mode"), delay=0)
 
-        is_db_file = loc.endswith(".db")
-        is_json_file = loc.endswith((".json", ".yaml", ".yml"))
-
-        if mode == "overwrite":
-            if os.path.exists(loc):
-                os.remove(loc)
-            if is_db_file:
-                shutil.copyfile(f"{self.data_folder}/data.db", loc)
-            elif is_json_file:
-                with open(loc, "w") as f:
-                    f.write(self.fetch_all_data_as_json(f"{self.data_folder}/data.db"))
-        elif mode == "modify":
-            if is_db_file:
-                self.modify_sqlite_db(loc, self.fetch_all_data_as_json(f"{self.data_folder}/data.db", return_dict=True))
-            elif is_json_file:
-                new_data = self.fetch_all_data_as_json(f"{self.data_folder}/data.db", return_dict=True)
-                self.modify_json_file(loc, new_data)
-        else:
-            if not os.path.exists(loc):
-                if is_db_file:
-                    shutil.copyfile(f"{self.data_folder}/data.db", loc)
-                elif is_json_file:
-                    with open(loc, "w") as f:
-                        f.write(self.fetch_all_data_as_json(f"{self.data_folder}/data.db"))
+    def auto_export_settings(self, keys: list):
+        """Called by the settings after they wrote keys, the exporter only writes those once things calmed down."""
+        sett = self.settings.get_cached("advanced_settings")
+        self.exporter.request(sett.get("settings_file_path"), sett.get("settings_file_mode"), keys)
 
     def switch_provider(self, name: str):
         provider_name = f"AutoProviderPlugin{name}"
         if provider_name not in self.provider_dict:
             provider_name = f"AutoProviderPlugin{self.settings.get_default_setting('provider')}"
-        provider_cls = self.provider_dict[provider_name]
+        provider_cls = self.provider_manager.get_provider_class(provider_name)
 
         self.provider = provider_cls(self.settings.get_title(), self.settings.get_chapter(),
                                      self.settings.get_chapter_rate(), self.data_folder, self.cache_folder,
-                                     self.settings.get_provider_type(), num_workers=self.settings.get_advanced_settings()["misc"]["num_workers"])
+                                     self.settings.get_provider_type(), num_workers=self.settings.get_misc("num_workers"))
         self.provider.set_blacklisted_websites(self.settings.get_blacklisted_websites())
+        self.provider.set_chapter_cache(self.chapter_cache)
+        self.provider.set_url_cache(self.url_cache)
+        self.provider.page_ready_callback = self.page_ready.emit  # Queued to the GUI thread
+        self.provider.download_done_callback = self.chapter_downloaded.emit
+        self.provider.restore_chapter()
 
         if self.provider.get_search_results(None):
-            self.search_widget.set_search_results_func(self.provider.get_search_results)
+            self.search_widget.set_search_results_func(self.provider.get_search_results,
+                                                     self.provider.get_provider_name())
             self.search_widget.setEnabled(True)  # self.search_toggle_button.setEnabled(False)
         else:
             self.search_widget.setEnabled(False)  # self.search_toggle_button.setEnabled(False)
 
-        new_pixmap = QPixmap(os.path.abspath(self.provider.get_logo_path()))
-        self.transparent_image.setPixmap(new_pixmap)
+        self.transparent_image.setPixmap(self.provider_icons.get_logo(self.provider.get_logo_path(), self.width() // 3))
         self.update_provider_logo()
 
+    def get_max_cache_size(self):
+        return self.settings.get_misc("max_cache_size_mb", 500) * 1024 * 1024
+
     def reload_window_title(self):
         new_title = ' '.join(word[0].upper() + word[1:] if word else '' for word in self.provider.get_title().split())
         self.setWindowTitle(f'MV 166 | {new_title}, Chapter {self.provider.get_chapter()}')
@@ -656,9 +675,10 @@ class MainWindow(QMainWindow):
     def get_content_paths(self, allowed_file_formats: tuple = None):
         if allowed_file_formats is None:
             allowed_file_formats = ('.png', ".jpg", ".jpeg", ".webp", ".http", '.mp4', '.txt')
-        content_files = sorted([f for f in os.listdir(self.cache_folder) if
+        content_folder = self.provider.get_current_cache_folder()
+        content_files = sorted([f for f in os.listdir(content_folder) if
                                 f.endswith(allowed_file_formats)])
-        content_paths = [os.path.join(self.cache_folder, f) for f in content_files]
+        content_paths = [os.path.join(content_folder, f) for f in content_files]
         return content_paths
 
     # Helper Functions
@@ -794,16 +814,21 @@ class MainWindow(QMainWindow):
     def downscale_checkbox_toggled(self):
         self.settings.set_downscaling(self.downscale_checkbox.isChecked())
         self.downscaling = self.downscale_checkbox.isChecked()
-        self.force_rescale = True
+        self.request_rescale()
+
+    def lazy_loading_checkbox_toggled(self):
+        self.settings.set_lazy_loading(self.lazy_loading_checkbox.isChecked())
+        self.lazy_loading = self.lazy_loading_checkbox.isChecked()
+        self.request_rescale()
 
     def upscale_checkbox_toggled(self):
         self.settings.set_upscaling(self.upscale_checkbox.isChecked())
         self.upscaling = self.upscale_checkbox.isChecked()
-        self.force_rescale = True
+        self.request_rescale()
 
     def apply_manual_content_width(self):
         self.settings.set_manual_content_width(self.manual_width_spinbox.value())
-        self.force_rescale = True
+        self.request_rescale()
 
     def set_title(self):
         new_title = self.title_selector.text().strip()
@@ -846,15 +871,23 @@ class MainWindow(QMainWindow):
             self.toggle_search_bar()
         self.save_last_title(self.provider.get_title())
 
+    def selected_result_source(self, provider_name):
+        """Switches to the provider a federated search result came from, before the title gets loaded."""
+        previous_provider = self.provider
+        self.provider_combobox.blockSignals(True)
+        self.provider_combobox.setCurrentText(provider_name)
+        self.provider_combobox.blockSignals(False)
+        self.switch_provider(provider_name)
+        if type(self.provider) is not type(previous_provider):
+            self.provider.redo_prep()
+
     def save_last_title(self, title):
         if self.settings.get_save_last_titles():
-            sett = self.settings.get_advanced_settings()
-            title = title.lower()
-            print(title)
-            if title in sett["recent_titles"]:
-                sett["recent_titles"].remove(title)
-            sett["recent_titles"].append(title)
-            self.settings.set_advanced_settings(sett)
+            self.library.mark_read(title, self.provider.get_provider_name(), self.provider.get_chapter(),
+                                   self.provider.get_current_url())
+            chapter_index = self.provider.get_chapter_index(fetch=False)
+            if chapter_index is not None and len(chapter_index):
+                self.library.set_latest_chapter(title, chapter_index.chapters[-1])
 
     def change_provider_type(self):
         self.settings.set_provider_type(self.provider_type_combobox.currentText().lower())
@@ -947,42 +980,33 @@ class MainWindow(QMainWindow):
         min_size = self.width() // 10
         content_width = self.transparent_image.pixmap().width() if self.transparent_image.pixmap() else 0  # Adjust the size of the transparent image based on window width
         if not min_size <= content_width <= max_size:  # If the current image width is outside the min and max size range, resize it
-            scaled_pixmap = QPixmap(os.path.abspath(self.provider.get_logo_path())).scaledToWidth(max_size, Qt.SmoothTransformation)
-            self.transparent_image.setPixmap(scaled_pixmap)
+            self.transparent_image.setPixmap(self.provider_icons.get_logo(self.provider.get_logo_path(), max_size))
         self.transparent_image.setFixedSize(max_size, max_size)
 
     # Rest
     def reload_providers(self):
         provider_manager = AutoProviderManager(self.extensions_folder, AutoProviderPlugin, [
-                        AutoProviderPlugin, AutoProviderBaseLike, AutoProviderBaseLike2])
+                        AutoProviderPlugin, AutoProviderBaseLike, AutoProviderBaseLike2],
+                        manifest_path=os.path.join(self.state_folder, "providers.json"),
+                        probe_args=("", 1, 0.5, self.data_folder, self.cache_folder, "direct"))
+        self.provider_manager = provider_manager
         self.provider_dict = provider_manager.get_providers()
 
         self.provider_combobox.clear()
+        search_sources = {}
 
-        for i, provider_name in enumerate(self.provider_dict.keys()):
-            provider = self.provider_dict[provider_name]("", 1, 0.5, self.data_folder, self.cache_folder, "direct")
-
-            icon_path = provider.get_logo_path()
-            image = QImage(os.path.abspath(icon_path))
-
-            if provider.clipping_space is not None:
-                start_x, start_y, end_x, end_y = provider.clipping_space
-
-                print("Cropping", image.height(), "x", image.width(), "for", provider_name)
-                cropped_image = image.copy(start_y if start_y != "max" else image.width(),
-                                           start_x if start_x != "max" else image.height(),
-                                           end_y if end_y != "max" else image.width(),
-                                           end_x if end_x != "max" else image.height())
-            else:
-                print("Cube cropping", image.height(), "for", provider_name)
-                cropped_image = image.copy(0, 0, image.height(), image.height())
-            icon = QIcon(QPixmap.fromImage(cropped_image))
+        for i, (provider_name, provider_info) in enumerate(self.provider_dict.items()):
+            icon = self.provider_icons.get_icon(provider_info["logo_path"], provider_info["clipping_space"])
 
             # Add item to the dropdown
             self.provider_combobox.addItem(icon, provider_name.replace("AutoProviderPlugin", ""))
             if "AutoProviderPlugin" not in provider_name:
                 self.provider_combobox.setItemUnselectable(i)
+            elif provider_info["capabilities"]["search"]:  # The provider only gets constructed once it is searched
+                search_sources[provider_name.replace("AutoProviderPlugin", "")] = (
+                    lambda text, name=provider_name: provider_manager.get_instance(name).get_search_results(text), icon)
         self.provider_combobox.setCurrentText(self.settings.get_provider())
+        self.search_widget.set_sources(search_sources)
 
     def save_settings(self):
         if hasattr(self, "settings") and self.settings.is_open:
@@ -1041,7 +1065,6 @@ class MainWindow(QMainWindow):
         self.stay_on_top_checkbox.setChecked(self.settings.get_stay_on_top())
 
         self.save_last_titles_checkbox.setChecked(self.settings.get_save_last_titles())
-        self.settings.get_advanced_settings()
 
         self.setGeometry(*(self.geometry().getRect()[:2] if not reload_position else (100, 100)),
                          *(self.settings.get_geometry()[2:] if not reload_geometry else (800, 630)))
@@ -1067,7 +1090,7 @@ class MainWindow(QMainWindow):
         self.reload_acrylic_menus_setting()
         self.reload_acrylic_background_setting()
 
-        self.force_rescale = True
+        self.request_rescale()
 
         self.reload_hide_titlebar_setting()
         self.reload_hide_scrollbar_setting()
@@ -1080,8 +1103,17 @@ class MainWindow(QMainWindow):
         self.last_reload_ts = time.time()
         self.downscaling = self.downscale_checkbox.isChecked()
         self.upscaling = self.upscale_checkbox.isChecked()
+        self.lazy_loading = self.lazy_loading_checkbox.isChecked()
 
     # Content management methods
+    def request_rescale(self):
+        self.force_rescale = True
+        self.relayout_timer.start()
+
+    def relayout(self):
+        if not self.threading:  # chapter_loading_wrapper requests a rescale once it is done
+            self.update_content()
+
     def get_wanted_width(self):
         scroll_area_width = self.scrollarea.viewport().width() + self.scrollarea.verticalScrollBar().width()
         # if len(self.content_widgets) > 0:
@@ -1103,6 +1135,7 @@ class MainWindow(QMainWindow):
             elif self.upscaling and standard_image_width < scroll_area_width:
                 new_image_width = scroll_area_width
             self.force_rescale = False
+            self.content_width = new_image_width
             return new_image_width
         return None
 
@@ -1110,28 +1143,47 @@ class MainWindow(QMainWindow):
         wanted_image_width = self.get_wanted_width()
         if wanted_image_width is None:
             return
-
-        for widget, path in zip(self.content_widgets, self.content_paths):
-            if isinstance(widget, QLabel):
-                pixmap = widget.pixmap()
-                if pixmap:
-                    if wanted_image_width != pixmap.width():
-                        pixmap.load(path)
-                        widget.setPixmap(pixmap.scaledToWidth(wanted_image_width,
-                                                              Qt.TransformationMode.SmoothTransformation))
-                else:
-                    font = widget.font()
-                    # Apply transformations here
-                    widget.setFont(font)
-            elif isinstance(widget, QVideoWidget) or isinstance(widget, QWebEngineView):
-                widget.setFixedWidth(wanted_image_width)
-
-        height = 0
-        for widget in [self.scrollarea.content_widget.layout().itemAt(i).widget() for i in range(self.scrollarea.content_widget.layout().count())]:
-            if hasattr(widget, "pixmap") and widget.pixmap():
-                height += widget.pixmap().height()
-            else:
-                height += widget.sizeHint().height()
+        with self.tracer.span("layout", reason="rescale", width=wanted_image_width):
+            self._update_content(wanted_image_width)
+
+    def _update_content(self, wanted_image_width: int):
+        for page, path in zip(self.content_pages, self.content_paths):
+            page.set_path(path)
+            if not page.is_loaded():
+                page.set_placeholder(path, wanted_image_width)
+                if not self.lazy_loading:
+                    page.load(wanted_image_width, self.image_loader)
+            elif not self.lazy_loading and page.pixmap().width() != wanted_image_width:
+                page.load(wanted_image_width, self.image_loader)  # The old size stays until the new one is done
+
+        self.rebuild_page_heights()
+        self.update_content_height()
+        self.update_visible_pages()
+
+    def get_page_spacing(self):
+        return max(0, self.content_layout.spacing())
+
+    def rebuild_page_heights(self):
+        """Every page height plus the spacing after it, positions and the content height are derived from this."""
+        spacing = self.get_page_spacing()
+        for i, page in enumerate(self.content_pages):
+            page.page_index = i
+        self.page_heights.reset(page.get_content_height() + spacing for page in self.content_pages)
+        self.active_pages = {page for page in self.content_pages if page.is_loaded() or page.is_loading()}
+
+    def update_page_height(self, page: ImagePage) -> bool:
+        if not 0 <= page.page_index < len(self.content_pages) or self.content_pages[page.page_index] is not page:
+            return False
+        return self.page_heights.set(page.page_index, page.get_content_height() + self.get_page_spacing())
+
+    def get_page_top(self, index: int) -> int:
+        return self.content_layout.contentsMargins().top() + self.page_heights.prefix(index)
+
+    def update_content_height(self):
+        self.page_canvas.sync_height()
+        margins = self.content_layout.contentsMargins()
+        height = (margins.top() + self.page_heights.total + self.get_page_spacing()
+                  + self.buttons_widget.sizeHint().height() + margins.bottom())
 
         rescale_size = self.scrollarea.recorded_default_size
         rescale_size.setHeight(height)
@@ -1139,39 +1191,145 @@ class MainWindow(QMainWindow):
         self.scrollarea.reload_scrollbars()
 
     def reload_content(self):
+        with self.tracer.span("layout", reason="reload"):
+            self._reload_content()
+
+    def _reload_content(self):
         self.content_paths = self.get_content_paths()
-        content_widgets_length = len(self.content_widgets) - 1
-        i = 0
+        width = self.get_page_width()
+        if not all(content_path.endswith((".png", ".jpg", ".jpeg", ".webp")) for content_path in self.content_paths):
+            raise Exception
 
+        # Pages are reused, the list is shared with the page canvas
+        del self.content_pages[len(self.content_paths):]
         for i, content_path in enumerate(self.content_paths):
-            if content_path.endswith((".png", ".jpg", ".jpeg", ".webp")):
-                if i > content_widgets_length:
-                    image_label = ImageLabel()
-                    self.content_widgets.append(image_label)
-                    pixmap = QPixmap(content_path)
-                else:
-                    image_label = self.content_widgets[i]
-                    pixmap = image_label.pixmap()
-                    pixmap.load(content_path)
-                image_label.setPixmap(pixmap)
-                image_label.setAlignment(Qt.AlignCenter)
-            else:
-                raise Exception
+            if i >= len(self.content_pages):
+                self.content_pages.append(ImagePage())
+            page = self.content_pages[i]
+            page.set_placeholder(content_path, width)
+            if not self.lazy_loading:
+                page.load(width, self.image_loader)
+
+        self.rebuild_page_heights()
+        self.update_content()
+        self.update_content_height()
+        self.update_visible_pages()
 
-            self.content_layout.addWidget(image_label)
-            QApplication.processEvents()
+    def get_page_width(self):
+        return self.content_width or self.manual_width_spinbox.value()
 
-        # Clear remaining existing content
-        content_widgets_length = len(self.content_widgets) - 1
-        for j, widget in enumerate(self.content_widgets.copy()[::-1]):
-            j = content_widgets_length - j
-            if j > i:
-                self.content_widgets.pop(j)
-                self.content_layout.removeWidget(widget)
-                widget.deleteLater()
+    def get_scaled_cache_size(self):
+        return self.settings.get_misc("scaled_cache_mb", 128) * 1024 * 1024
 
-        self.content_layout.addWidget(self.buttons_widget)
-        self.update_content()
+    def get_image_memory_budget(self):
+        return self.settings.get_misc("image_memory_mb", 256) * 1024 * 1024
+
+    def update_visible_pages(self):
+        """
+        Loads the pages around the viewport and turns far away pages back into placeholders once the loaded
+        pixmaps use more than the image memory budget.
+        """
+        if not self.lazy_loading or not self.content_pages:
+            return
+        with self.tracer.span("visible pages"):
+            self._update_visible_pages()
+
+    def _update_visible_pages(self):
+        top = self.scrollarea.verticalScrollBar().value()
+        viewport_height = self.scrollarea.height()
+        near_top, near_bottom = top - viewport_height, top + 2 * viewport_height  # One screen of margin
+        width = self.get_page_width()
+        changed = False
+
+        # Only the pages in range and the ones that are already loaded get looked at
+        index = self.page_heights.find(max(0, near_top - self.content_layout.contentsMargins().top()))
+        page_top = self.get_page_top(index)
+        near_pages = set()
+        while index < len(self.content_pages) and page_top <= near_bottom:
+            page = self.content_pages[index]
+            if not page.is_loaded() or page.pixmap().width() != width:
+                page.load(width, self.image_loader)
+                self.active_pages.add(page)
+            near_pages.add(page)
+            page_top += self.page_heights.heights[index]
+            index += 1
+
+        far_pages = []
+        for page in self.active_pages - near_pages:
+            if page.is_loaded() and page.pixmap().width() == width:
+                page_top = self.get_page_top(page.page_index)
+                page_bottom = page_top + page.get_content_height()
+                far_pages.append((max(near_top - page_bottom, page_top - near_bottom), page))
+            else:  # Outdated or scrolled past before it was done
+                page.set_placeholder(page.path, width)
+                self.active_pages.discard(page)
+                changed = self.update_page_height(page) or changed
+
+        usage = sum(page.get_memory_usage() for page in self.active_pages)
+        budget = self.get_image_memory_budget()
+        for _, page in sorted(far_pages, key=lambda far_page: far_page[0], reverse=True):
+            if usage <= budget:
+                break
+            usage -= page.get_memory_usage()
+            page.set_placeholder(page.path, width)
+            self.active_pages.discard(page)
+            changed = self.update_page_height(page) or changed
+        if changed:
+            self.update_content_height()
+
+    def page_loaded(self, page: ImagePage):
+        self.active_pages.add(page)
+        self.update_page_height(page)
+        self.pages_loaded_timer.start()
+
+    def pages_loaded(self):
+        self.update_content_height()
+        self.update_visible_pages()  # Keeps the memory budget
+
+    def insert_page(self, content_path: str):
+        """Inserts a single page that was downloaded after the last reload_content at its place in the chapter."""
+        if content_path in self.content_paths or not os.path.isfile(content_path):
+            return
+        if self.content_paths and os.path.dirname(self.content_paths[0]) != os.path.dirname(content_path):
+            return
+        index = bisect.bisect(self.content_paths, content_path)  # Page names are zero padded, so this is page order
+        page = ImagePage()
+        page.set_placeholder(content_path, self.get_page_width())
+        if not self.lazy_loading:
+            page.load(self.get_page_width(), self.image_loader)
+        self.content_paths.insert(index, content_path)
+        self.content_pages.insert(index, page)
+        self.rebuild_page_heights()
+        self.update_content_height()
+        self.update_visible_pages()
+
+    def on_page_ready(self, slot_name: str, content_path: str):
+        # While a chapter is loading, reload_content picks up everything that is already on disk afterward
+        if not self.threading and slot_name == self.provider.current_slot_name:
+            self.insert_page(content_path)
+
+    def on_chapter_downloaded(self, slot_name: str, failed_pages: list):
+        if failed_pages:
+            self.failed_downloads[slot_name] = failed_pages
+        if not self.threading:  # The slot only becomes the current one once loading is done
+            self.report_failed_pages()
+
+    def report_failed_pages(self):
+        failed_pages = self.failed_downloads.pop(self.provider.current_slot_name, None)
+        self.failed_downloads.clear()  # Other slots get downloaded again once they are opened
+        if failed_pages:
+            self.show_failed_pages(failed_pages)
+
+    def show_failed_pages(self, failed_pages: list):
+        """Tells which pages are missing without blocking the pages that are there, reloading tries them again."""
+        pages = ", ".join(str(page + 1) for page, _ in failed_pages)
+        self.failed_pages_box = AdvancedQMessageBox(
+            self, QMessageBox.Icon.Warning, "Info | Pages are missing",
+            f"{len(failed_pages)} page(s) of this chapter could not be downloaded: {pages}.\n"
+            "Reload the chapter to try them again.",
+            "\n".join(f"Page {page + 1}: {url}" for page, url in failed_pages))
+        self.failed_pages_box.setModal(False)
+        self.failed_pages_box.show()
 
     # Chapter methods
     def threading_wrapper(self, new_thread, blocking, func, *args, **kwargs):
@@ -1193,6 +1351,8 @@ class MainWindow(QMainWindow):
         self.threading = False
 
     def chapter_loading_wrapper(self, func, fail_info, fail_text):
+        span = self.tracer.span("chapter switch", func=func.__name__).start()
+        self.save_reading_position()
         self.provider.redo_prep()
         self.threading_wrapper(True, True, func)
 
@@ -1202,17 +1362,24 @@ class MainWindow(QMainWindow):
             self.task_successful = False
             self.save_last_title(self.provider.get_title())
         else:
-            self.provider.set_chapter(self.settings.get_chapter())
-            self.provider.reload_chapter()
+            self.provider.load_chapter(self.settings.get_chapter())
             QMessageBox.information(self, fail_info, fail_text,
                                     QMessageBox.StandardButton.Ok,
                                     QMessageBox.StandardButton.Ok)
         self.chapter_selector.setText(str(self.settings.get_chapter()))
+        self.reading = (self.provider.get_title(), self.settings.get_chapter())
         print("Reloading images ...")
         self.scrollarea.verticalScrollBar().setValue(0)
         self.scrollarea.horizontalScrollBar().setValue((self.scrollarea.width() // 2))
         self.reload_content()
-        self.force_rescale = True
+        self.request_rescale()
+        position = self.library.get_position(*self.reading)
+        if position is not None:  # Continue where this chapter was left, once it is laid out
+            QTimer.singleShot(50, lambda: (self.scrollarea.verticalScrollBar().setValue(position[0]),
+                                           self.scrollarea.horizontalScrollBar().setValue(position[1])))
+        self.report_failed_pages()
+        self.provider.prefetch_neighbours()
+        span.finish(chapter=self.settings.get_chapter())
 
     def next_chapter(self):
         self.chapter_loading_wrapper(self.provider.next_chapter, "Info | Loading of chapter has failed!",
@@ -1251,8 +1418,17 @@ class MainWindow(QMainWindow):
         if can_exit:
             print("Exiting ...")
             self.save_settings()
+            self.save_reading_position()
+            if self.tracer.enabled:
+                self.tracer.export(os.path.join(self.data_folder, "trace.json"))
+            self.settings.flush()
+            self.exporter.close()  # Prints, so before stdout is closed
             sys.stdout.close()
             self.settings.close()
+            self.chapter_cache.close()
+            self.search_widget.stop()
+            self.image_loader.close()
+            HttpClient.get_instance().close()
             event.accept()  # let the window close
         else:
             print("Couldn't exit.")
@@ -1260,7 +1436,7 @@ class MainWindow(QMainWindow):
 
     # Theme methods
     def set_theme(self):
-        theme_setting = self.settings.get_advanced_settings()["themes"][self.os_theme]
+        theme_setting = self.settings.get_theme(self.os_theme)
 
         theme = getattr(Themes, theme_setting)
         if theme.stylesheet is not None:
@@ -1268,7 +1444,7 @@ class MainWindow(QMainWindow):
         if theme.app_style is not None:
             self.app.setStyle(theme.app_style)
         icon_theme_color = theme.theme_style if theme.theme_style != "os" else self.os_theme
-        font = QFont(self.settings.get_advanced_settings().get("themes").get("font"), self.font().pointSize())
+        font = QFont(self.settings.get_theme("font"), self.font().pointSize())
         self.setFont(font)
         for child in self.findChildren(QWidget):
             child.setFont(font)
@@ -1296,16 +1472,15 @@ class MainWindow(QMainWindow):
         if hasattr(self, "window_layout"):
             self.reload_acrylic_menus_setting()
 
-    def timer_tick(self):
-        if not self.threading:
-            self.update_content()
-        if random.randint(0, 20) == 0:
-            os_theme = (self.system.get_windows_theme() or os.environ.get("MV_THEME")).lower()
-            if os_theme != self.os_theme:
-                self.update_theme(os_theme)
-
+    def os_theme_changed(self, color_scheme=None):
+        os_theme = (self.system.get_windows_theme() or os.environ.get("MV_THEME")
+                    or ("dark" if color_scheme == Qt.ColorScheme.Dark else "light")).lower()
+        if os_theme != self.os_theme:
+            self.update_theme(os_theme)
 
 if __name__ == "__main__":
+    set_dir_to_ex()
+    os.chdir(os.path.join(os.getcwd(), './_internal'))
     app = QApplication(sys.argv)
     RESTART_CODE = 1000
     window = MainWindow(app=app)